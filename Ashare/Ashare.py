@@ -1,5 +1,10 @@
 #-*- coding:utf-8 -*-    --------------Ashare 股票行情数据双核心版( https://github.com/mpquant/Ashare ) 
 import json,requests,datetime;      import pandas as pd  #
+from requests.adapters import HTTPAdapter;   from urllib3.util.retry import Retry
+class _TimeoutAdapter(HTTPAdapter):                                               #未指定timeout的请求默认10秒超时，卡死的连接不会一直占住连接池和线程
+    def send(self, request, **kwargs):  kwargs['timeout']=kwargs.get('timeout') or 10;   return super().send(request, **kwargs)
+session=requests.Session();   _adapter=_TimeoutAdapter(pool_connections=32, pool_maxsize=64, max_retries=Retry(total=2, backoff_factor=0.2))
+session.mount('http://',_adapter);   session.mount('https://',_adapter)        #共享连接池，复用TCP连接，避免每次请求重新握手
 
 #腾讯日线
 def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线获取  
@@ -7,7 +12,7 @@ def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线
     if end_date:  end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]
     end_date='' if end_date==datetime.datetime.now().strftime('%Y-%m-%d') else end_date   #如果日期今天就变成空    
     URL=f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},{unit},,{end_date},{count},qfq'     
-    st= json.loads(requests.get(URL).content);    ms='qfq'+unit;      stk=st['data'][code]   
+    st= json.loads(session.get(URL).content);    ms='qfq'+unit;      stk=st['data'][code]   
     buf=stk[ms] if ms in stk else stk[unit]       #指数返回不是qfqday,是day
     df=pd.DataFrame(buf,columns=['time','open','close','high','low','volume'],dtype='float')     
     df.time=pd.to_datetime(df.time);    df.set_index(['time'], inplace=True);   df.index.name=''          #处理索引 
@@ -18,7 +23,7 @@ def get_price_min_tx(code, end_date=None, count=10, frequency='1d'):    #分钟
     ts=int(frequency[:-1]) if frequency[:-1].isdigit() else 1           #解析K线周期数
     if end_date: end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else end_date.split(' ')[0]        
     URL=f'http://ifzq.gtimg.cn/appstock/app/kline/mkline?param={code},m{ts},,{count}' 
-    st= json.loads(requests.get(URL).content);       buf=st['data'][code]['m'+str(ts)] 
+    st= json.loads(session.get(URL).content);       buf=st['data'][code]['m'+str(ts)] 
     df=pd.DataFrame(buf,columns=['time','open','close','high','low','volume','n1','n2'])   
     df=df[['time','open','close','high','low','volume']]    
     df[['open','close','high','low','volume']]=df[['open','close','high','low','volume']].astype('float')
@@ -37,7 +42,7 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):    #新浪全
         count=count+(datetime.datetime.now()-end_date).days//unit            #结束时间到今天有多少天自然日(肯定 >交易日)        
         #print(code,end_date,count)    
     URL=f'http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData?symbol={code}&scale={ts}&ma=5&datalen={count}' 
-    dstr= json.loads(requests.get(URL).content);       
+    dstr= json.loads(session.get(URL).content);       
     #df=pd.DataFrame(dstr,columns=['day','open','high','low','close','volume'],dtype='float') 
     df= pd.DataFrame(dstr,columns=['day','open','high','low','close','volume'])
     df['open'] = df['open'].astype(float); df['high'] = df['high'].astype(float);                          #转换数据类型
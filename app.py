@@ -1,47 +1,409 @@
 # app.py (精简版)
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request
 from datetime import datetime
 import threading
 import time
 import os
-import json
+import fcntl
+import gzip
+import hashlib
+import uuid
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import orjson
+import numpy as np
 import pandas as pd
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
 from apscheduler.triggers.cron import CronTrigger
 
 
+from mods.serialization import ORJSON_OPTIONS, ORJSONProvider, json_response, now_iso
+
 # 导入独立的分析模块
 from mods.stock_analyzer import (
     StockAnalyzer,
-    BatchStockAnalyzer,
     analyze_stock_simple,
     batch_analyze_stocks,
+    fetch_daily_frames,
     get_2min_data
 )
 
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)  # request.get_json 等也使用 orjson
 
 # ==================== 全局变量 ====================
-ALL_STOCKS = []  # 股票列表
-ANALYSIS_RESULTS = []  # 分析结果
-TOP_STOCKS = []  # 前10名股票
+ALL_STOCKS = pd.DataFrame({'symbol': pd.Series(dtype='string')})  # 股票列表（列式存储）
+ALL_STOCKS_BYTES = b'[]'  # /api/stocks 的序列化快照
+# 分析结果与前10名为不可变元组，每日分析后整体替换引用，读取方无需加锁
+ANALYSIS_RESULTS = ()  # 分析结果
+TOP_STOCKS = ()  # 前10名股票
 DATA_DIR = 'data'
+UNIVERSE_FEATHER = os.path.join(DATA_DIR, 'universe.feather')  # 股票池（列式存储）
+UNIVERSE_JSON = os.path.join(DATA_DIR, 'universe.json')  # 旧格式，首次加载时转换为 feather
+HISTORY_FILE = os.path.join(DATA_DIR, 'history.ndjson.gz')  # 历史分析结果（追加写入）
+# 最近一次每日分析的快照：只有运行定时任务的 worker 写入，所有 worker 按文件修改时间重新加载
+SNAPSHOT_FILE = os.path.join(DATA_DIR, 'latest_analysis.json')
+
+# 分析结果缓存：同一交易分钟内的重复请求复用上一次的计算结果
+ANALYZE_CACHE_SECONDS = 60
+# 固定数量的分段锁，股票代码按哈希分配，并发的缓存未命中合并为一次计算；锁的数量不随请求的代码增长。
+# 与网络请求线程池一样在 worker 进程内首次使用时创建：gevent 补丁之后创建的才是协程锁，
+# 持锁等待网络时不会卡住整个 worker
+ANALYZE_LOCK_STRIPES = 64
+_ANALYZE_LOCKS = ()
+_ANALYZE_LOCKS_PID = None
+
+# 批量分析进程池：批量任务在后台进程中执行，不占用请求线程；
+# 进程池随任务创建、任务结束即关闭，空闲的 worker 不常驻分析进程
+BATCH_WORKERS = os.cpu_count() or 1
+# 任务状态保存在文件中（data/jobs/<job_id>.json），任意 worker 都能查询其他 worker 提交的任务
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+MAX_JOBS = 100  # 最多保留的任务数量
+
+# 批量任务并发控制：所有 worker 进程共用一个文件锁，同一时间只运行一个批量任务（最多 BATCH_WORKERS 个分析进程）；
+# 进行中的任务记录在 inflight.json，相同请求（不论发到哪个 worker）复用该任务
+BATCH_LOCK_FILE = os.path.join(DATA_DIR, 'batch.lock')
+INFLIGHT_FILE = os.path.join(JOBS_DIR, 'inflight.json')
+
+# 请求内的网络请求线程池（与指标计算并行获取数据），在 worker 进程内首次使用时创建：
+# gunicorn 预加载应用时，模块在 fork 和 gevent 补丁之前导入，不能在导入时创建
+_IO_EXECUTOR = None
+_IO_EXECUTOR_PID = None
+
+# /api/analysis/top 的序列化快照，每日分析后重建一次
+TOP_STOCKS_BYTES = b''
+TOP_STOCKS_ETAG = ''  # 快照内容的哈希，客户端缓存未过期时返回 304
+TOP_STOCKS_MAX_AGE = 300  # 客户端缓存秒数
+_SNAPSHOT_MTIME = None  # 已加载快照文件的修改时间
+
+# 跨域响应头，所有响应共用同一份
+_CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,PUT,POST,DELETE,OPTIONS'
+}
+
+def build_top_stocks_snapshot(last_update=None):
+    """将前10名股票序列化为响应字节，请求时直接返回"""
+    global TOP_STOCKS_BYTES, TOP_STOCKS_ETAG
+    
+    top_stocks = TOP_STOCKS
+    snapshot = orjson.dumps({
+        'success': True,
+        'top_stocks': top_stocks,
+        'last_update': last_update,
+        'count': len(top_stocks)
+    }, option=ORJSON_OPTIONS)
+    TOP_STOCKS_BYTES, TOP_STOCKS_ETAG = snapshot, f'"{hashlib.sha1(snapshot).hexdigest()}"'
+
+build_top_stocks_snapshot()
+
+def publish_analysis_snapshot(results, top_stocks, last_update):
+    """将分析结果写入共享快照文件（先写临时文件再原子替换，读取方不会读到半个文件）"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_file = f'{SNAPSHOT_FILE}.{os.getpid()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(orjson.dumps({
+            'last_update': last_update,
+            'results': results,
+            'top_stocks': top_stocks
+        }, option=ORJSON_OPTIONS))
+    os.replace(tmp_file, SNAPSHOT_FILE)
+
+def refresh_analysis_snapshot():
+    """快照文件有更新时重新加载分析结果并重建响应快照，各 worker 的 ETag 因此一致"""
+    global ANALYSIS_RESULTS, TOP_STOCKS, _SNAPSHOT_MTIME
+    
+    try:
+        mtime = os.stat(SNAPSHOT_FILE).st_mtime_ns
+        if mtime == _SNAPSHOT_MTIME:
+            return
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            snapshot = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return
+    
+    ANALYSIS_RESULTS, TOP_STOCKS = tuple(snapshot['results']), tuple(snapshot['top_stocks'])
+    build_top_stocks_snapshot(snapshot['last_update'])
+    _SNAPSHOT_MTIME = mtime
+
+# ==================== 股票列表 ====================
+
+def set_stock_list(raw_stocks):
+    """
+    设置全局股票列表
+    
+    Args:
+        raw_stocks: 股票字典列表或 DataFrame，至少包含 symbol 字段
+    """
+    global ALL_STOCKS, ALL_STOCKS_BYTES
+    
+    stocks = pd.DataFrame(raw_stocks)
+    if 'symbol' not in stocks.columns:
+        stocks['symbol'] = pd.Series(dtype='string')
+    
+    ALL_STOCKS = stocks.astype({'symbol': 'string'})
+    ALL_STOCKS_BYTES = orjson.dumps(ALL_STOCKS.to_dict(orient='records'), option=ORJSON_OPTIONS)
+
+def load_stock_universe():
+    """
+    加载股票池
+    
+    优先以内存映射方式读取 feather 文件；只有 JSON 时读取一次并转换为 feather
+    """
+    try:
+        if os.path.exists(UNIVERSE_FEATHER):
+            from pyarrow import feather  # feather 文件只可能由 pyarrow 写出
+            stocks = feather.read_table(UNIVERSE_FEATHER, memory_map=True).to_pandas()
+        elif os.path.exists(UNIVERSE_JSON):
+            with open(UNIVERSE_JSON, 'rb') as f:
+                stocks = pd.DataFrame(orjson.loads(f.read()))
+            try:
+                stocks.to_feather(UNIVERSE_FEATHER)
+                print(f"🔄 股票池已转换为 feather: {UNIVERSE_FEATHER}")
+            except Exception as e:
+                print(f"⚠️ 股票池转换 feather 失败，继续使用 JSON: {e}")
+        else:
+            print(f"⚠️ 未找到股票池文件: {UNIVERSE_FEATHER}")
+            return False
+    except Exception as e:
+        print(f"❌ 加载股票池失败: {e}")
+        return False
+    
+    set_stock_list(stocks)
+    return True
+
+def stock_symbols(limit):
+    """获取前 limit 只股票的代码列表"""
+    return ALL_STOCKS['symbol'].head(limit).to_list()
+
+# ==================== 分析缓存 ====================
+
+def _time_bucket():
+    """当前时间所在的缓存时间片"""
+    return int(time.time() // ANALYZE_CACHE_SECONDS)
+
+def _code_lock(stock_code):
+    """获取股票对应的分段锁（fork 后首次调用时创建本进程的锁）"""
+    global _ANALYZE_LOCKS, _ANALYZE_LOCKS_PID
+    
+    if _ANALYZE_LOCKS_PID != os.getpid():
+        _ANALYZE_LOCKS = tuple(threading.Lock() for _ in range(ANALYZE_LOCK_STRIPES))
+        _ANALYZE_LOCKS_PID = os.getpid()
+    return _ANALYZE_LOCKS[hash(stock_code) % ANALYZE_LOCK_STRIPES]
+
+@lru_cache(maxsize=4096)
+def _cached_analyze(stock_code, bucket):
+    """按 (股票代码, 时间片) 缓存的单只股票分析"""
+    return analyze_stock_simple(stock_code)
+
+@lru_cache(maxsize=1024)
+def _cached_analyzer(stock_code, bucket):
+    """按 (股票代码, 时间片) 缓存已计算指标的分析器"""
+    analyzer = StockAnalyzer(stock_code)
+    if not analyzer.df.empty:
+        analyzer.calculate_indicators()
+    return analyzer
+
+def get_analysis(stock_code):
+    """获取单只股票分析结果（带缓存）"""
+    bucket = _time_bucket()
+    with _code_lock(stock_code):
+        return _cached_analyze(stock_code, bucket)
+
+def get_analyzer(stock_code):
+    """获取已计算指标的分析器（带缓存）"""
+    bucket = _time_bucket()
+    with _code_lock(stock_code):
+        return _cached_analyzer(stock_code, bucket)
+
+# ==================== 批量任务 ====================
+
+def io_executor():
+    """本进程的网络请求线程池（fork 后首次调用时创建）"""
+    global _IO_EXECUTOR, _IO_EXECUTOR_PID
+    
+    if _IO_EXECUTOR_PID != os.getpid():
+        _IO_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+        _IO_EXECUTOR_PID = os.getpid()
+    return _IO_EXECUTOR
+
+def acquire_batch_lock(wait=False):
+    """
+    获取跨进程的批量任务锁
+    
+    Args:
+        wait: 锁被占用时是否等待（每秒重试，gevent 下不阻塞其他协程）
+    
+    Returns:
+        锁文件对象，关闭即释放；不等待且锁被占用时返回 None
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    lock = open(BATCH_LOCK_FILE, 'w')
+    while True:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock
+        except OSError:
+            if not wait:
+                lock.close()
+                return None
+            time.sleep(1)
+
+def submit_analysis_chunks(executor, stock_list, min_confidence, frames=None):
+    """
+    将批量分析提交到进程池
+    
+    股票列表按CPU核数切片，每个进程分析一片，分摊进程内的导入和初始化开销；
+    传入 frames 时各分片只携带自己的日线数据，进程内不再发起网络请求
+    """
+    chunk_size = max(1, -(-len(stock_list) // BATCH_WORKERS))
+    futures = []
+    for i in range(0, len(stock_list), chunk_size):
+        chunk = stock_list[i:i + chunk_size]
+        chunk_frames = {code: frames[code] for code in chunk if code in frames} if frames else None
+        futures.append(executor.submit(batch_analyze_stocks, chunk, min_confidence, chunk_frames))
+    return futures
+
+def _write_json(path, payload):
+    """原子写入 JSON 文件（先写临时文件再替换）"""
+    tmp_file = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(orjson.dumps(payload, option=ORJSON_OPTIONS))
+    os.replace(tmp_file, path)
+
+def _read_json(path):
+    """读取 JSON 文件，不存在或无法解析时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _job_file(job_id):
+    """任务状态文件路径"""
+    return os.path.join(JOBS_DIR, f'{job_id}.json')
+
+def _prune_jobs():
+    """删除最早的任务状态文件，只保留最近 MAX_JOBS 个"""
+    entries = [e for e in os.scandir(JOBS_DIR)
+               if e.name.endswith('.json') and e.path != INFLIGHT_FILE]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:-MAX_JOBS]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+def _finish_when_done(job_id, futures, executor, lock):
+    """
+    跟踪任务进度：每个分片完成时更新状态文件；全部完成后写入前10名结果，
+    移除进行中记录、关闭进程池并释放批量任务锁
+    """
+    total = len(futures)
+    remaining = [total]
+    guard = threading.Lock()
+    
+    def _finish():
+        try:
+            try:
+                results = collect_batch_job(futures)
+                top_stocks = select_top(results, 10)  # 只保留前10名
+                state = {'status': 'done', 'count': len(results), 'top_stocks': top_stocks}
+            except Exception as e:
+                state = {'status': 'error', 'error': str(e)}
+            _write_json(_job_file(job_id), state)
+            try:
+                os.remove(INFLIGHT_FILE)
+            except OSError:
+                pass
+        finally:
+            executor.shutdown(wait=False)
+            lock.close()
+    
+    def _done(_):
+        with guard:
+            remaining[0] -= 1
+            left = remaining[0]
+            if left:
+                _write_json(_job_file(job_id), {'status': 'pending', 'progress': f'{total - left}/{total}'})
+        if not left:
+            _finish()
+    
+    if not futures:
+        _finish()
+    
+    for fut in futures:
+        fut.add_done_callback(_done)
+
+def start_batch_job(stock_list, min_confidence):
+    """
+    启动批量任务（去重 + 并发限制，跨 worker 进程生效）
+    
+    Returns:
+        (job_id, 是否复用了进行中的任务)；超过并发限制时 job_id 为 None
+    """
+    key = hashlib.sha1(orjson.dumps([list(stock_list), float(min_confidence)])).hexdigest()
+    
+    lock = acquire_batch_lock()
+    if lock is None:
+        # 已有任务在运行（可能在其他 worker 中），相同请求复用该任务
+        inflight = _read_json(INFLIGHT_FILE)
+        if inflight and inflight['key'] == key:
+            return inflight['job_id'], True
+        return None, False
+    
+    executor = ProcessPoolExecutor(max_workers=BATCH_WORKERS)
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        futures = submit_analysis_chunks(executor, stock_list, min_confidence)
+        job_id = uuid.uuid4().hex
+        _write_json(_job_file(job_id), {'status': 'pending', 'progress': f'0/{len(futures)}'})
+        _write_json(INFLIGHT_FILE, {'key': key, 'job_id': job_id})
+        _prune_jobs()
+    except Exception:
+        executor.shutdown(wait=False)
+        lock.close()
+        raise
+    
+    _finish_when_done(job_id, futures, executor, lock)
+    return job_id, False
+
+def collect_batch_job(futures):
+    """合并各分片的分析结果"""
+    results = []
+    for fut in futures:
+        results.extend(fut.result())
+    return results
+
+def select_top(results, top_n=10):
+    """
+    按信心分数取前N名
+    
+    稳定排序，分数相同的股票保持原有顺序（与 sorted(reverse=True) 一致）
+    """
+    if not results:
+        return []
+    
+    scores = np.fromiter((r['analysis']['confidence_score'] for r in results),
+                         dtype=np.float64, count=len(results))
+    idx = np.argsort(-scores, kind='stable')[:top_n]
+    return [results[i] for i in idx]
 
 # ==================== API路由 ====================
 
 @app.after_request
 def after_request(response):
     """允许跨域"""
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.update(_CORS_HEADERS)
     return response
 
 @app.route('/')
 def index():
     """主页"""
-    return jsonify({
+    return json_response({
         'service': '股票分析API',
         'version': '4.0',
         'modules': 'stock_analyzer.py 独立分析模块',
@@ -49,7 +411,8 @@ def index():
             '/': '本页面',
             '/api/analyze': '分析单只股票',
             '/api/stock/detail': '股票详情（2分钟数据）',
-            '/api/analysis/batch': '批量分析',
+            '/api/analysis/batch': '批量分析（后台任务）',
+            '/api/analysis/result/<job_id>': '获取批量分析结果',
             '/api/analysis/top': '获取前10名',
             '/api/stocks': '获取股票列表',
             '/api/health': '健康检查'
@@ -62,11 +425,11 @@ def analyze_stock_api():
     stock_code = request.args.get('code', '').strip()
     
     if not stock_code:
-        return jsonify({'success': False, 'error': '需要股票代码'}), 400
+        return json_response({'success': False, 'error': '需要股票代码'}, 400)
     
-    # 使用独立模块的分析函数
-    result = analyze_stock_simple(stock_code)
-    return jsonify(result)
+    # 使用独立模块的分析函数（同一分钟内复用缓存结果）
+    result = get_analysis(stock_code)
+    return json_response(result)
 
 @app.route('/api/stock/detail', methods=['GET'])
 def get_stock_detail_api():
@@ -75,99 +438,142 @@ def get_stock_detail_api():
     minutes = int(request.args.get('minutes', '60'))
     
     if not stock_code:
-        return jsonify({'success': False, 'error': '需要股票代码'}), 400
+        return json_response({'success': False, 'error': '需要股票代码'}, 400)
     
     try:
-        # 1. 获取2分钟数据
-        two_min_data = get_2min_data(stock_code, minutes)
+        # 1. 后台获取2分钟数据，与日线分析并行
+        two_min_future = io_executor().submit(get_2min_data, stock_code, minutes)
         
-        # 2. 获取日线分析
-        analyzer = StockAnalyzer(stock_code)
+        # 2. 获取日线分析（分析器按分钟缓存，指标只计算一次）
+        analyzer = get_analyzer(stock_code)
         if analyzer.df.empty:
-            return jsonify({'success': False, 'error': '无法获取股票数据'}), 404
-        
-        analyzer.calculate_indicators()
-        day_result = analyzer.analyze()
+            return json_response({'success': False, 'error': '无法获取股票数据'}, 404)
         
-        # 3. 获取实时分析
-        realtime_result = analyzer.analyze_realtime(minutes=30)
+        # 3. 日线分析与实时分析一次完成
+        day_result, realtime_result = analyzer.analyze_both(rt_minutes=30)
+        two_min_data = two_min_future.result()
         
         # 4. 整合结果
         result = {
             'success': True,
             'stock_code': stock_code,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now_iso(),
             'two_minute_data': two_min_data,
             'day_analysis': day_result,
             'realtime_analysis': realtime_result
         }
         
-        return jsonify(result)
+        return json_response(result)
         
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return json_response({'success': False, 'error': str(e)}, 500)
 
 @app.route('/api/analysis/batch', methods=['POST'])
 def batch_analyze_api():
-    """批量分析股票"""
+    """批量分析股票（提交后台任务，立即返回任务ID）"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         
-        if not data or 'stocks' not in data:
+        if 'stocks' not in data:
             # 使用全局股票列表
-            if not ALL_STOCKS:
-                return jsonify({'success': False, 'error': '股票列表为空'}), 400
+            if ALL_STOCKS.empty:
+                return json_response({'success': False, 'error': '股票列表为空'}, 400)
             
-            stock_list = [s['symbol'] for s in ALL_STOCKS[:100]]  # 限制数量
+            stock_list = stock_symbols(100)  # 限制数量
         else:
             stock_list = data['stocks']
         
         min_confidence = data.get('min_confidence', 80.0)
         
-        # 使用独立模块的批量分析函数
-        results = batch_analyze_stocks(stock_list, min_confidence)
+        # 提交到进程池，通过 /api/analysis/result/<job_id> 获取结果
+        job_id, reused = start_batch_job(stock_list, min_confidence)
         
-        return jsonify({
+        if job_id is None:
+            return json_response({'success': False, 'error': '已有批量任务在运行，请稍后再试'}, 429)
+        
+        return json_response({
             'success': True,
-            'count': len(results),
-            'results': results[:10],  # 只返回前10名
-            'top_stocks': results[:10]
-        })
+            'job_id': job_id,
+            'status': 'pending',
+            'reused': reused,
+            'stocks_count': len(stock_list)
+        }, 202)
         
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return json_response({'success': False, 'error': str(e)}, 500)
 
-@app.route('/api/analysis/top', methods=['GET'])
-def get_top_stocks_api():
-    """获取前10名股票"""
-    return jsonify({
+@app.route('/api/analysis/result/<job_id>', methods=['GET'])
+def get_batch_result_api(job_id):
+    """获取批量分析任务结果（从任务状态文件读取，任务可以由任意 worker 提交）"""
+    job = _read_json(_job_file(job_id)) if job_id.isalnum() else None
+    
+    if job is None:
+        return json_response({'success': False, 'error': '任务不存在'}, 404)
+    
+    if job['status'] == 'pending':
+        return json_response({
+            'success': True,
+            'job_id': job_id,
+            'status': 'pending',
+            'progress': job['progress']
+        }, 202)
+    
+    if job['status'] == 'error':
+        return json_response({'success': False, 'job_id': job_id, 'error': job['error']}, 500)
+    
+    top_stocks = job['top_stocks']
+    
+    return json_response({
         'success': True,
-        'top_stocks': TOP_STOCKS,
-        'last_update': datetime.now().isoformat(),
-        'count': len(TOP_STOCKS)
+        'job_id': job_id,
+        'status': 'done',
+        'count': job['count'],
+        'results': top_stocks,
+        'top_stocks': top_stocks
     })
 
+@app.route('/api/stocks', methods=['GET'])
+def get_stocks_api():
+    """获取股票列表（直接返回预序列化的快照）"""
+    return Response(ALL_STOCKS_BYTES, mimetype='application/json')
+
+@app.route('/api/analysis/top', methods=['GET'])
+def get_top_stocks_api():
+    """获取前10名股票（直接返回预序列化的快照，内容未变化时返回 304）"""
+    refresh_analysis_snapshot()
+    body, etag = TOP_STOCKS_BYTES, TOP_STOCKS_ETAG
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={TOP_STOCKS_MAX_AGE}'}
+    
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers=headers)
+    
+    return Response(body, mimetype='application/json', headers=headers)
+
 # ==================== 定时任务 ====================
 
 def daily_analysis_task():
     """每日分析任务"""
-    global TOP_STOCKS, ANALYSIS_RESULTS
-    
-    if not ALL_STOCKS:
+    if ALL_STOCKS.empty:
         print("⚠️ 股票列表为空，跳过分析")
         return
     
     print(f"🚀 开始每日分析任务，股票数量: {len(ALL_STOCKS)}")
     
-    # 使用独立模块进行批量分析
-    batch_analyzer = BatchStockAnalyzer(
-        stock_list=[s['symbol'] for s in ALL_STOCKS[:200]],  # 限制数量
-        period_days=120
-    )
+    # 先并发获取全部日线数据，再按CPU核数分片并行分析
+    stock_list = stock_symbols(200)  # 限制数量
+    frames = fetch_daily_frames(stock_list, period_days=120)
+    # 与批量任务共用文件锁，有批量任务在运行时等它结束
+    lock = acquire_batch_lock(wait=True)
+    try:
+        with ProcessPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+            futures = submit_analysis_chunks(executor, stock_list, 80.0, frames)
+            results = collect_batch_job(futures)
+    finally:
+        lock.close()
     
-    results = batch_analyzer.analyze_all(min_confidence=80.0)
-    TOP_STOCKS = batch_analyzer.get_top_stocks(top_n=10)
-    ANALYSIS_RESULTS = results
+    # 写入共享快照，本进程和其他 worker 都从快照文件加载新结果（一次性替换全局引用）
+    publish_analysis_snapshot(results, select_top(results, 10), datetime.now().isoformat())
+    refresh_analysis_snapshot()
     
     # 保存结果
     save_analysis_results()
@@ -175,29 +581,36 @@ def daily_analysis_task():
     print(f"✅ 分析完成，找到 {len(results)} 只高信心股票")
 
 def save_analysis_results():
-    """保存分析结果"""
+    """
+    保存分析结果
+    
+    追加写入同一个 gzip 压缩的 NDJSON 历史文件：每次运行追加一个 gzip 成员，
+    每行一条分析结果并带上本次运行的时间戳（run_timestamp，不覆盖结果自身的 timestamp），无需重写已有数据
+    """
     try:
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR)
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = os.path.join(DATA_DIR, f'top_stocks_{timestamp}.json')
+        results = ANALYSIS_RESULTS
+        timestamp = datetime.now().isoformat()
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                'timestamp': datetime.now().isoformat(),
-                'top_stocks': TOP_STOCKS,
-                'total_analyzed': len(ANALYSIS_RESULTS)
-            }, f, ensure_ascii=False, indent=2)
+        with gzip.open(HISTORY_FILE, 'ab', compresslevel=3) as f:
+            for row in results:
+                f.write(orjson.dumps({**row, 'run_timestamp': timestamp}, option=ORJSON_OPTIONS) + b'\n')
         
-        print(f"💾 结果已保存: {filename}")
+        print(f"💾 结果已追加: {HISTORY_FILE}（{len(results)} 条）")
         
     except Exception as e:
         print(f"❌ 保存结果失败: {e}")
 
 def schedule_daily_analysis():
     """设置定时分析"""
-    scheduler = BackgroundScheduler()
+    # 只有一个每日任务，单线程执行器即可，避免默认的10线程池；
+    # 错过的执行合并为一次，且同一时间只允许一个实例运行
+    scheduler = BackgroundScheduler(
+        executors={'default': SchedulerThreadPool(max_workers=1)},
+        job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 600}
+    )
     
     # 周一到周五，下午13:30执行
     scheduler.add_job(
@@ -216,23 +629,69 @@ def schedule_daily_analysis():
     print("⏰ 定时分析任务已设置: 周一到周五 13:30")
     return scheduler
 
+def warm_up_analyzer():
+    """用合成行情预热分析流程，首个真实请求不再承担冷启动开销"""
+    n = 200
+    close = 100 + np.cumsum(np.sin(np.arange(n, dtype=np.float64) / 5))
+    df = pd.DataFrame({
+        'open': close - 0.5,
+        'close': close,
+        'high': close + 1.0,
+        'low': close - 1.0,
+        'volume': np.full(n, 1e6)
+    }, index=pd.date_range('2000-01-03', periods=n, freq='B'))
+    
+    analyzer = StockAnalyzer('warmup', n, df=df)
+    analyzer.calculate_indicators()
+    analyzer.analyze()
+
+SCHEDULER_LOCK_FILE = os.path.join(DATA_DIR, 'scheduler.lock')
+_SCHEDULER_LOCK = None
+
+def start_scheduler_once():
+    """多进程部署时只有拿到文件锁的进程运行定时任务；该进程退出后锁释放，新进程接手"""
+    global _SCHEDULER_LOCK
+    
+    os.makedirs(DATA_DIR, exist_ok=True)
+    lock = open(SCHEDULER_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return None
+    
+    _SCHEDULER_LOCK = lock
+    return schedule_daily_analysis()
+
 # ==================== 启动应用 ====================
 
 if __name__ == '__main__':
     print("🚀 股票分析API服务启动中...")
     print("📦 使用独立分析模块: stock_analyzer.py")
     
+    # 生产环境：交给 gunicorn 多进程 + gevent worker（数据目录、股票池和预热都在 gunicorn_conf.py 的钩子中完成）
+    if not os.environ.get('DEV'):
+        os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn_conf.py', 'app:app'])
+    
+    # 以下为开发模式（DEV=1）：单进程 Flask 开发服务器
     # 初始化数据目录
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
     
+    # 加载股票池（首次启动时生成 Feather 文件）
+    load_stock_universe()
+    
     # 启动定时任务
     scheduler = schedule_daily_analysis()
     
+    # 预热分析流程
+    warm_up_analyzer()
+    
     print("\n📊 API端点:")
     print("  GET  /api/analyze?code=股票代码     - 分析单只股票")
     print("  GET  /api/stock/detail?code=股票代码 - 股票详情（2分钟数据）")
-    print("  POST /api/analysis/batch            - 批量分析")
+    print("  POST /api/analysis/batch            - 批量分析（返回任务ID）")
+    print("  GET  /api/analysis/result/<job_id>  - 获取批量分析结果")
     print("  GET  /api/analysis/top              - 获取前10名")
     
     print("\n💡 独立模块使用示例:")
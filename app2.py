@@ -1,28 +1,44 @@
 # stock_api.py
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, render_template
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
+import orjson
 from datetime import datetime, timedelta
-from Ashare.Ashare import get_price, requests, get_price_min_tx
+from Ashare.Ashare import get_price, session, get_price_min_tx
 import warnings
 import json
+import gzip
 import threading
 import time
-from collections import deque
-import re
+import atexit
+from collections import OrderedDict
+from bisect import bisect_right
 import os
+from concurrent.futures import ThreadPoolExecutor
+from mods.indicators import signal_indicators, round_values, risk_stats
+from mods.stock_analyzer import SIGNAL_LEVELS, SIGNAL_THRESHOLDS, fetch_daily
+from mods.serialization import ORJSON_OPTIONS, ORJSONProvider, json_response
 
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)  # 允许跨域请求
 
 
 # ==================== 全局配置 ====================
-ALL_STOCKS = []  # 全局存储所有股票列表
+ALL_STOCKS = pd.DataFrame({'code': pd.Series(dtype=object), 'name': pd.Series(dtype=object)})  # 股票列表（列式存储）
+_STOCKS_JSON_CACHE = {}  # (页码, 每页数量, 搜索词) -> (响应字节, gzip 压缩后的字节或 None, 对应的股票列表更新时间)
+_STOCKS_JSON_CACHE_MAX = 1024  # 超过后整体清空，避免任意搜索词撑大缓存
+_STOCKS_PRECOMPUTE_PER_PAGE = (50, 100, 200)  # 股票列表更新后预先序列化的每页数量（无搜索词）
+_GZIP_MIN_SIZE = 1024  # 小于这个字节数的响应不压缩
+_SEARCH_INDEX = {}  # 搜索索引 {'blob'/'symbol_name'/'code': 大写字符串数组, 'stocks': 股票表}，随股票列表一起更新
 LAST_UPDATE_TIME = None
 UPDATE_INTERVAL = 24 * 3600  # 24小时更新一次（秒）
+_STOP_UPDATE = threading.Event()  # 置位后后台更新线程退出
+_UPDATE_LOCK = threading.Lock()  # 股票列表更新锁：并发请求、后台更新和手动更新同一时间只获取一次
+atexit.register(_STOP_UPDATE.set)
 
 # 分析结果存储
 ANALYSIS_RESULTS = []  # 存储所有股票分析结果
@@ -30,6 +46,11 @@ TOP_STOCKS = []  # 存储成功率最高的10支股票
 LAST_ANALYSIS_TIME = None
 ANALYSIS_IN_PROGRESS = False  # 防止重复分析
 
+# 分析结果中输出的指标：(输出名, 指标列, 保留小数位数)
+RESULT_INDICATORS = (('MA5', 'MA5', 2), ('MA10', 'MA10', 2), ('MA20', 'MA20', 2), ('RSI', 'RSI', 2),
+                     ('MACD', 'MACD', 4), ('KD_K', '%K', 2), ('KD_D', '%D', 2), ('BB_position', 'BB_position', 3))
+_RESULT_DECIMALS = [decimals for _, _, decimals in RESULT_INDICATORS]
+
 # 创建数据目录
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 if not os.path.exists(DATA_DIR):
@@ -41,31 +62,30 @@ def fetch_all_stocks():
     从API获取所有股票列表
     注意：这是一个示例URL，实际使用时需要确认正确的API
     """
-    global ALL_STOCKS, LAST_UPDATE_TIME
+    global ALL_STOCKS, LAST_UPDATE_TIME, _SEARCH_INDEX
     
     try:
         print("🔄 开始更新股票列表...")
         
         stock_url = "https://api.biyingapi.com/hslt/list/biyinglicence"
-        resp = requests.get(stock_url, timeout=10)
+        resp = session.get(stock_url, timeout=10)
         resp.raise_for_status()
         stocks_data = resp.json()
-        # 使用正则过滤掉名称中包含 ST 或 *ST 的股票
-        pattern = re.compile(r"\*?ST", re.IGNORECASE)
-        filtered_stocks = []
-        for stock in stocks_data:
-            if pattern.search(stock["mc"]):
-                continue  # 跳过 ST/*ST
-            code = stock["jys"] + stock["dm"]  # 原始 code，例如 SZ000001.SZ
-            # 去掉 .后缀并转小写
-            code = code.split('.')[0].lower()
-            filtered_stocks.append({
-                "code": code,
-                "name": stock["mc"],
-            })
-        
+        # 按列取出字段，转换和过滤都在 numpy 字符串数组上整列完成
+        names = np.array([stock["mc"] for stock in stocks_data], dtype=str)
+        codes = np.char.add(np.array([stock["jys"] for stock in stocks_data], dtype=str),
+                            np.array([stock["dm"] for stock in stocks_data], dtype=str))  # 原始 code，例如 SZ000001.SZ
+        # 去掉 .后缀并转小写（numpy 的 partition 不支持空数组）
+        if codes.size:
+            codes = np.char.lower(np.char.partition(codes, '.')[:, 0])
+        # 过滤掉名称中包含 ST 或 *ST 的股票（*ST 也包含 ST，一次子串判断即可）
+        keep = np.char.find(np.char.upper(names), 'ST') < 0
+        filtered_stocks = pd.DataFrame({'code': codes[keep], 'name': names[keep]}, dtype=object)
+        
+        _SEARCH_INDEX = _build_search_index(filtered_stocks)
         ALL_STOCKS = filtered_stocks
         LAST_UPDATE_TIME = datetime.now()
+        _precompute_stock_pages()
         
         print(f"✅ 股票列表更新完成！共 {len(ALL_STOCKS)} 只股票")
         print(f"📅 最后更新时间: {LAST_UPDATE_TIME}")
@@ -76,168 +96,274 @@ def fetch_all_stocks():
         print(f"❌ 获取股票列表失败: {e}")
         
         # 返回一些基础股票作为后备
-        fallback_stocks = [
+        fallback_stocks = pd.DataFrame([
             {'symbol': 'sh000001', 'name': '上证指数', 'code': '000001', 'exchange': 'SH', 'market': '指数', 'full_code': 'sh000001', 'display_name': 'sh000001 上证指数'},
             {'symbol': 'sz399001', 'name': '深证成指', 'code': '399001', 'exchange': 'SZ', 'market': '指数', 'full_code': 'sz399001', 'display_name': 'sz399001 深证成指'},
-        ]
+        ], dtype=object)
+        _SEARCH_INDEX = _build_search_index(fallback_stocks)
         ALL_STOCKS = fallback_stocks
         LAST_UPDATE_TIME = datetime.now()
         
         return False
 
+def _build_search_index(stocks):
+    """
+    为股票列表构建搜索索引，每只股票只做一次大写转换
+    
+    大写字段存成 numpy 字符串数组，搜索时整列匹配得到布尔掩码，不再逐只股票循环
+    """
+    def upper_column(name):
+        if name not in stocks.columns:
+            return np.full(len(stocks), '', dtype='<U1')
+        return np.char.upper(stocks[name].fillna('').to_numpy(dtype=str))
+    
+    symbol_names = np.char.add(np.char.add(upper_column('symbol'), '\0'), upper_column('name'))
+    codes = upper_column('code')
+    return {
+        'blob': np.char.add(np.char.add(symbol_names, '\0'), codes),
+        'symbol_name': symbol_names,
+        'code': codes,
+        'stocks': stocks
+    }
+
+def _search_matches(mask):
+    """
+    按布尔掩码搜索股票
+    
+    Returns:
+        (股票表, 匹配股票的行号数组)，只保存行号，分页后再取出需要的行，不复制整个匹配结果
+    """
+    return _SEARCH_INDEX['stocks'], np.flatnonzero(mask)
+
 def auto_update_stocks():
-    """后台自动更新股票列表"""
+    """后台自动更新股票列表：直接休眠到下次更新时间，收到停止信号立即退出"""
     while True:
         try:
-            now = datetime.now()
-            
-            # 检查是否需要更新（每24小时）
-            if LAST_UPDATE_TIME is None or (now - LAST_UPDATE_TIME).total_seconds() >= UPDATE_INTERVAL:
-                fetch_all_stocks()
+            # 距离下次更新的秒数（每24小时），至少等待1分钟
+            if LAST_UPDATE_TIME is None:
+                wait_seconds = 0
             else:
-                next_update = LAST_UPDATE_TIME + timedelta(seconds=UPDATE_INTERVAL)
+                elapsed = (datetime.now() - LAST_UPDATE_TIME).total_seconds()
+                wait_seconds = max(60, UPDATE_INTERVAL - elapsed)
+                next_update = datetime.now() + timedelta(seconds=wait_seconds)
                 print(f"⏰ 下次更新: {next_update}")
             
-            # 休眠1小时检查一次
-            time.sleep(3600)
+            if _STOP_UPDATE.wait(wait_seconds):
+                break
+            with _UPDATE_LOCK:
+                fetch_all_stocks()
             
         except Exception as e:
             print(f"自动更新出错: {e}")
-            time.sleep(300)  # 出错后休眠5分钟
+            if _STOP_UPDATE.wait(300):  # 出错后休眠5分钟
+                break
+
+def _stocks_page(stocks, page, per_page, search, rows=None):
+    """
+    序列化 /api/stocks 的一页
+    
+    Args:
+        stocks: 股票表
+        rows: 参与分页的行号数组（搜索结果），为空时为全部股票
+    
+    Returns:
+        (响应字节, gzip 压缩后的字节)，响应太小时不压缩，第二项为 None
+    """
+    total = len(stocks) if rows is None else len(rows)
+    start = (page - 1) * per_page
+    end = start + per_page
+    # 先对行号分页，只取出并转换当前页的行
+    paged_stocks = stocks.iloc[slice(start, end) if rows is None else rows[start:end]].to_dict(orient='records')
+    
+    body = orjson.dumps({
+        'success': True,
+        'data': paged_stocks,
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'total_pages': (total + per_page - 1) // per_page
+        },
+        'summary': {
+            'total_stocks': total,
+            'search_term': search if search else None,
+            'last_update': LAST_UPDATE_TIME.isoformat() if LAST_UPDATE_TIME else None
+        }
+    }, option=ORJSON_OPTIONS)
+    
+    gz_body = gzip.compress(body, compresslevel=6) if len(body) >= _GZIP_MIN_SIZE else None
+    return body, gz_body
+
+def _precompute_stock_pages():
+    """股票列表更新后预先序列化常用的分页，请求时直接返回字节，序列化和压缩的开销只在更新时付一次"""
+    _STOCKS_JSON_CACHE.clear()
+    total = len(ALL_STOCKS)
+    for per_page in _STOCKS_PRECOMPUTE_PER_PAGE:
+        for page in range(1, max(1, (total + per_page - 1) // per_page) + 1):
+            body, gz_body = _stocks_page(ALL_STOCKS, page, per_page, '')
+            _STOCKS_JSON_CACHE[(page, per_page, '')] = (body, gz_body, LAST_UPDATE_TIME)
+
+def _stocks_response(body, gz_body):
+    """客户端接受 gzip 时返回压缩后的响应"""
+    if gz_body is not None and 'gzip' in request.accept_encodings:
+        response = Response(gz_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
 
 def get_stocks_list():
     """获取股票列表（带缓存和更新检查）"""
     global ALL_STOCKS, LAST_UPDATE_TIME
-    print("🔄 股票列表需要更新...")
-    # 如果列表为空或需要更新
-    if not ALL_STOCKS or (LAST_UPDATE_TIME and 
-                         (datetime.now() - LAST_UPDATE_TIME).total_seconds() >= UPDATE_INTERVAL):
-        print("🔄 股票列表需要更新...")
-        fetch_all_stocks()
+    # 如果列表为空或需要更新；拿到锁后再检查一次，等锁期间其他线程可能已经更新完成
+    if _stocks_need_update():
+        with _UPDATE_LOCK:
+            if _stocks_need_update():
+                print("🔄 股票列表需要更新...")
+                fetch_all_stocks()
     
     return ALL_STOCKS
 
+def _stocks_need_update():
+    """股票列表为空或已超过更新间隔"""
+    return ALL_STOCKS.empty or (LAST_UPDATE_TIME and
+                                (datetime.now() - LAST_UPDATE_TIME).total_seconds() >= UPDATE_INTERVAL)
+
 
 # 缓存系统（减少重复计算）
 class CacheManager:
-    def __init__(self, ttl=300):  # 默认5分钟缓存
-        self.cache = {}
+    """带过期时间和容量上限的缓存：读取不加锁，写入时淘汰过期和超出容量的条目"""
+    def __init__(self, ttl=300, maxsize=4096):  # 默认5分钟缓存
+        self.cache = OrderedDict()  # 按写入时间排序，最旧的在前
         self.ttl = ttl
+        self.maxsize = maxsize
         self.lock = threading.Lock()
     
     def get(self, key):
-        with self.lock:
-            if key in self.cache:
-                data, timestamp = self.cache[key]
-                if time.time() - timestamp < self.ttl:
-                    return data
-                else:
-                    del self.cache[key]
+        entry = self.cache.get(key)
+        if entry is not None:
+            data, timestamp = entry
+            if time.time() - timestamp < self.ttl:
+                return data
         return None
     
     def set(self, key, value):
+        now = time.time()
         with self.lock:
-            self.cache[key] = (value, time.time())
+            self.cache[key] = (value, now)
+            self.cache.move_to_end(key)
+            
+            # 从最旧的条目开始淘汰，直到没有过期条目且不超过容量
+            while self.cache:
+                _, timestamp = next(iter(self.cache.values()))
+                if now - timestamp < self.ttl and len(self.cache) <= self.maxsize:
+                    break
+                self.cache.popitem(last=False)
+    
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
 
 cache = CacheManager()
+analysis_cache = CacheManager()  # 单只股票的分析结果，与行情数据同样5分钟过期
 
 class StockSignalAnalyzer:
     """股票信号分析器（优化版）"""
     
     def __init__(self, stock_code, period_days=120):
+        """只保存参数，不做网络请求；调用 fetch() 获取数据"""
         self.stock_code = stock_code
         self.period_days = period_days
-        self.df = None
+        self._arr = {}  # 原始行情列的 numpy 数组（只提取一次），DataFrame 只在获取数据时使用
+        self._ind = {}  # 技术指标的 numpy 数组
         self.signals = {}
         self.confidence_score = 0
+    
+    def fetch(self):
+        """获取股票数据（优先使用缓存），返回自身以便链式调用"""
         self._fetch_data()
+        return self
+    
+    @property
+    def n_days(self):
+        """已获取的交易日数量（获取失败为 0）"""
+        return len(self._arr['close']) if self._arr else 0
     
     def _fetch_data(self):
         """获取股票数据"""
-        cache_key = f"data_{self.stock_code}_{self.period_days}"
+        # 内存缓存只保存行情列的 numpy 数组，不保存整个 DataFrame
+        cache_key = (self.stock_code, self.period_days)
         cached_data = cache.get(cache_key)
         
         if cached_data is not None:
-            self.df = cached_data
+            self._arr = cached_data
             return
         
         try:
-            self.df = get_price(
-                self.stock_code,
-                frequency='1d',
-                count=self.period_days
-            )
+            # 日线数据与 stock_analyzer 共用同一缓存层（交易时段按 DAILY_CACHE_TTL 过期，休市期间磁盘缓存到下次开盘）
+            df = fetch_daily(self.stock_code, self.period_days)
             
-            if not self.df.empty:
-                # 计算基本指标
-                self.df['returns'] = self.df['close'].pct_change()
-                self.df['log_returns'] = np.log(self.df['close'] / self.df['close'].shift(1))
-                cache.set(cache_key, self.df)
+            if not df.empty:
+                # 计算基本指标（在 numpy 数组上计算，一次 assign 写回）
+                close = df['close'].to_numpy(dtype=np.float64)
+                ratio = np.empty_like(close)
+                ratio[0] = np.nan
+                ratio[1:] = close[1:] / close[:-1]
+                df = df.assign(returns=ratio - 1, log_returns=np.log(ratio))
                 
         except Exception as e:
             print(f"数据获取失败 {self.stock_code}: {e}")
-            self.df = pd.DataFrame()
+            df = pd.DataFrame()
+        
+        self._extract_arrays(df)
+        if self._arr:
+            cache.set(cache_key, self._arr)
+    
+    def _extract_arrays(self, df):
+        """将行情列提取为连续的 float64 数组，后续计算直接使用数组而不经过 DataFrame"""
+        if df.empty:
+            self._arr = {}
+            return
+        
+        self._arr = {
+            k: df[k].to_numpy(dtype=np.float64)
+            for k in ('open', 'high', 'low', 'close', 'volume', 'returns')
+        }
     
     def calculate_all_indicators(self):
         """计算所有技术指标"""
-        if self.df.empty or len(self.df) < 30:
+        if self.n_days < 30:
             return False
         
-        df = self.df.copy()
-        
-        # 移动平均线
-        for window in [5, 10, 20, 30, 60]:
-            df[f'MA{window}'] = df['close'].rolling(window=window).mean()
-        
-        # MACD
-        exp1 = df['close'].ewm(span=12, adjust=False).mean()
-        exp2 = df['close'].ewm(span=26, adjust=False).mean()
-        df['MACD'] = exp1 - exp2
-        df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        df['MACD_hist'] = df['MACD'] - df['MACD_signal']
-        
-        # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # 布林带
-        df['BB_middle'] = df['close'].rolling(window=20).mean()
-        bb_std = df['close'].rolling(window=20).std()
-        df['BB_upper'] = df['BB_middle'] + (bb_std * 2)
-        df['BB_lower'] = df['BB_middle'] - (bb_std * 2)
-        df['BB_position'] = (df['close'] - df['BB_lower']) / (df['BB_upper'] - df['BB_lower'])
-        
-        # 成交量
-        df['volume_ma5'] = df['volume'].rolling(window=5).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_ma5']
-        
-        # KD指标
-        low_14 = df['low'].rolling(window=14).min()
-        high_14 = df['high'].rolling(window=14).max()
-        df['%K'] = 100 * ((df['close'] - low_14) / (high_14 - low_14))
-        df['%D'] = df['%K'].rolling(window=3).mean()
-        
-        self.df = df
+        # 指标只保存在 numpy 数组中，不复制也不修改 DataFrame
+        cols = signal_indicators(self._arr['close'], self._arr['high'],
+                                 self._arr['low'], self._arr['volume'])
+        self._ind = cols
         return True
     
     def analyze(self):
         """综合分析"""
-        if self.df.empty or len(self.df) < 30:
+        if self.n_days < 30:
             return self._empty_result()
         
-        self._analyze_signals()
+        # 最新两日的行情与指标只取一次，信号分析和结果生成共用
+        latest = self._row(-1)
+        prev = self._row(-2)
+        
+        self._analyze_signals(latest, prev)
         self._calculate_confidence()
         
-        return self._generate_result()
+        return self._generate_result(latest)
     
-    def _analyze_signals(self):
+    def _row(self, i):
+        """取第 i 个交易日的行情与指标（标量字典），替代 DataFrame 的逐行 iloc"""
+        row = {k: v[i] for k, v in self._arr.items()}
+        row.update({k: v[i] for k, v in self._ind.items()})
+        return row
+    
+    def _analyze_signals(self, latest, prev):
         """分析技术信号"""
-        latest = self.df.iloc[-1]
-        prev = self.df.iloc[-2]
-        
         self.signals = {
             'trend': self._analyze_trend(latest, prev),
             'momentum': self._analyze_momentum(latest, prev),
@@ -261,7 +387,8 @@ class StockSignalAnalyzer:
             reasons.append("价格站上20日线")
         
         # 趋势强度
-        ma_slope = (latest['MA5'] - self.df['MA5'].iloc[-6]) / self.df['MA5'].iloc[-6] * 100
+        ma5_prev = self._ind['MA5'][-6]
+        ma_slope = (latest['MA5'] - ma5_prev) / ma5_prev * 100
         if ma_slope > 1:
             trend_score += 10
             reasons.append(f"短期均线上涨{ma_slope:.1f}%")
@@ -337,39 +464,24 @@ class StockSignalAnalyzer:
         """检查价格形态"""
         patterns = []
         
-        # 检查最近5天的形态
-        recent = self.df.tail(5)
+        # 最近3天的K线数据（numpy 切片，不构造逐行 Series）
+        o, h, l, c = (self._arr[k][-3:] for k in ('open', 'high', 'low', 'close'))
+        body = np.abs(c - o)
+        lower_shadow = np.minimum(c, o) - l
+        upper_shadow = h - np.maximum(c, o)
         
-        # 锤子线
-        if self._is_hammer(recent.iloc[-1]):
+        # 锤子线：下影线长于实体2倍，上影线短于实体一半
+        if lower_shadow[-1] > body[-1] * 2 and upper_shadow[-1] < body[-1] * 0.5:
             patterns.append("锤子线形态")
         
-        # 早晨之星
-        if len(recent) >= 3 and self._is_morning_star(recent.iloc[-3], recent.iloc[-2], recent.iloc[-1]):
+        # 早晨之星：第一天阴线，第二天跳空低开，第三天阳线且收盘价超过第一天中点
+        if len(c) >= 3 and (
+            c[0] < o[0] and o[1] < c[0] and c[2] > o[2] and c[2] > (o[0] + c[0]) / 2
+        ):
             patterns.append("早晨之星")
         
         return {'patterns': patterns, 'score': len(patterns) * 10}
     
-    def _is_hammer(self, candle):
-        """判断是否为锤子线"""
-        body_size = abs(candle['close'] - candle['open'])
-        lower_shadow = min(candle['close'], candle['open']) - candle['low']
-        upper_shadow = candle['high'] - max(candle['close'], candle['open'])
-        
-        return lower_shadow > body_size * 2 and upper_shadow < body_size * 0.5
-    
-    def _is_morning_star(self, day1, day2, day3):
-        """判断是否为早晨之星"""
-        # 第一天是阴线
-        day1_bearish = day1['close'] < day1['open']
-        # 第二天跳空低开
-        gap_down = day2['open'] < day1['close']
-        # 第三天是阳线且收盘价超过第一天中点
-        day3_bullish = day3['close'] > day3['open']
-        recovery = day3['close'] > (day1['open'] + day1['close']) / 2
-        
-        return day1_bearish and gap_down and day3_bullish and recovery
-    
     def _calculate_confidence(self):
         """计算综合信心分数"""
         total_score = 0
@@ -385,12 +497,11 @@ class StockSignalAnalyzer:
         
         self.confidence_score = min(total_score, 100)
     
-    def _generate_result(self):
+    def _generate_result(self, latest):
         """生成分析结果"""
-        latest = self.df.iloc[-1]
-        prev = self.df.iloc[-2]
+        close = self._arr['close']
         
-        price_change = ((latest['close'] - prev['close']) / prev['close'] * 100)
+        price_change = ((close[-1] - close[-2]) / close[-2] * 100)
         
         # 收集所有理由
         all_reasons = []
@@ -402,40 +513,19 @@ class StockSignalAnalyzer:
         if 'patterns' in self.signals and self.signals['patterns']['patterns']:
             all_reasons.extend(self.signals['patterns']['patterns'])
         
-        # 生成交易信号
-        if self.confidence_score >= 75:
-            signal = "强烈买入"
-            action = "BUY"
-            position = "中等仓位(30-50%)"
-        elif self.confidence_score >= 60:
-            signal = "买入"
-            action = "BUY"
-            position = "轻仓位(20-30%)"
-        elif self.confidence_score >= 45:
-            signal = "关注"
-            action = "HOLD"
-            position = "观望"
-        else:
-            signal = "回避"
-            action = "SELL"
-            position = "不建议"
+        # 生成交易信号（按分数所在的档位查表）
+        signal, action, position = SIGNAL_LEVELS[bisect_right(SIGNAL_THRESHOLDS, self.confidence_score)]
         
         return {
             'stock_code': self.stock_code,
             'timestamp': datetime.now().isoformat(),
-            'current_price': round(latest['close'], 2),
+            'current_price': round(close[-1], 2),
             'price_change': round(price_change, 2),
-            'volume': int(latest['volume']),
-            'indicators': {
-                'MA5': round(latest['MA5'], 2),
-                'MA10': round(latest['MA10'], 2),
-                'MA20': round(latest['MA20'], 2),
-                'RSI': round(latest['RSI'], 2),
-                'MACD': round(latest['MACD'], 4),
-                'KD_K': round(latest['%K'], 2),
-                'KD_D': round(latest['%D'], 2),
-                'BB_position': round(latest['BB_position'], 3)
-            },
+            'volume': int(self._arr['volume'][-1]),
+            'indicators': dict(zip(
+                (name for name, _, _ in RESULT_INDICATORS),
+                round_values([latest[column] for _, column, _ in RESULT_INDICATORS], _RESULT_DECIMALS)  # 全部指标一次舍入
+            )),
             'analysis': {
                 'confidence_score': round(self.confidence_score, 1),
                 'signal': signal,
@@ -449,22 +539,19 @@ class StockSignalAnalyzer:
     
     def _calculate_risk_metrics(self):
         """计算风险指标"""
-        if len(self.df) < 20:
+        if self.n_days < 20:
             return {}
         
-        returns = self.df['returns'].dropna()
+        returns_std, returns_mean, max_drawdown = risk_stats(self._arr['returns'])
         
         # 波动率
-        volatility = returns.std() * np.sqrt(252) * 100
+        volatility = returns_std * np.sqrt(252) * 100
         
         # 夏普比率
-        sharpe = returns.mean() / returns.std() * np.sqrt(252) if returns.std() > 0 else 0
+        sharpe = returns_mean / returns_std * np.sqrt(252) if returns_std > 0 else 0
         
         # 最大回撤
-        cumulative = (1 + returns).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        max_dd = drawdown.min() * 100
+        max_dd = max_drawdown * 100
         
         return {
             'volatility': round(volatility, 2),
@@ -481,13 +568,54 @@ class StockSignalAnalyzer:
             'timestamp': datetime.now().isoformat()
         }
 
+def analyze_stocks(stock_codes, period_days, max_workers=10):
+    """
+    批量分析多只股票
+    
+    先多线程并发获取数据，再把同样长度的行情堆叠成 (股票数, 天数) 矩阵一次计算全部指标，
+    最后逐只生成分析结果
+    
+    Returns:
+        与 stock_codes 顺序一致的分析结果列表，数据不足或失败的为 None
+    """
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(stock_codes)))) as executor:
+        analyzers = [StockSignalAnalyzer(code, period_days) for code in stock_codes]
+        list(executor.map(StockSignalAnalyzer.fetch, analyzers))
+    
+    # 按数据长度分组，每组一次矩阵运算
+    groups = {}
+    for analyzer in analyzers:
+        n = analyzer.n_days
+        if n >= 30:
+            groups.setdefault(n, []).append(analyzer)
+    
+    for group in groups.values():
+        stacked = {
+            k: np.stack([a._arr[k] for a in group])
+            for k in ('close', 'high', 'low', 'volume')
+        }
+        cols = signal_indicators(stacked['close'], stacked['high'], stacked['low'], stacked['volume'])
+        for i, analyzer in enumerate(group):
+            analyzer._ind = {k: v[i] for k, v in cols.items()}
+    
+    results = []
+    for analyzer in analyzers:
+        result = None
+        if analyzer._ind:
+            try:
+                result = analyzer.analyze()
+            except Exception as e:
+                print(f"分析失败 {analyzer.stock_code}: {e}")
+        results.append(None if result is None or 'error' in result else result)
+    return results
+
 # ==================== API路由 ====================
 
 
 @app.route('/')
 def index():
     """主页"""
-    return jsonify({
+    return json_response({
         'service': '股票分析API',
         'version': '2.0',
         'endpoints': {
@@ -496,6 +624,7 @@ def index():
             '/api/stocks': '获取所有股票列表',
             '/api/stocks/search?q=关键词': '搜索股票',
             '/api/stocks/update': '手动更新股票列表',
+            '/api/historical/股票代码?days=30': '历史日线（加 &format=columns 返回列式数据）',
             '/api/health': '健康检查'
         },
         'status': '运行中',
@@ -518,43 +647,30 @@ def get_stocks():
         # 获取股票列表
         stocks = get_stocks_list()
         
-        # 搜索过滤
+        # 股票列表未更新时直接返回已序列化的响应（常用分页在更新时已预先生成）
+        key = (page, per_page, search)
+        entry = _STOCKS_JSON_CACHE.get(key)
+        if entry is not None and entry[2] == LAST_UPDATE_TIME:
+            return _stocks_response(entry[0], entry[1])
+        
+        # 搜索过滤（使用预先构建的大写索引）
+        rows = None
         if search:
-            filtered = []
-            for stock in stocks:
-                if (search in stock.get('symbol', '').upper() or 
-                    search in stock.get('name', '').upper() or
-                    search in stock.get('code', '').upper()):
-                    filtered.append(stock)
-            stocks = filtered
-        
-        # 分页
-        total = len(stocks)
-        start = (page - 1) * per_page
-        end = start + per_page
-        paged_stocks = stocks[start:end]
-        
-        return jsonify({
-            'success': True,
-            'data': paged_stocks,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'total_pages': (total + per_page - 1) // per_page
-            },
-            'summary': {
-                'total_stocks': total,
-                'search_term': search if search else None,
-                'last_update': LAST_UPDATE_TIME.isoformat() if LAST_UPDATE_TIME else None
-            }
-        })
+            stocks, rows = _search_matches(np.char.find(_SEARCH_INDEX['blob'], search) >= 0)
+        
+        body, gz_body = _stocks_page(stocks, page, per_page, search, rows)
+        
+        if len(_STOCKS_JSON_CACHE) >= _STOCKS_JSON_CACHE_MAX:
+            _STOCKS_JSON_CACHE.clear()
+        _STOCKS_JSON_CACHE[key] = (body, gz_body, LAST_UPDATE_TIME)
+        
+        return _stocks_response(body, gz_body)
         
     except Exception as e:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/stocks/search', methods=['GET'])
 def search_stocks():
@@ -562,55 +678,51 @@ def search_stocks():
     query = request.args.get('q', '').strip()
     
     if not query:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': '请输入搜索关键词'
-        }), 400
+        }, 400)
     
-    stocks = get_stocks_list()
-    results = []
+    get_stocks_list()
+    query_upper = query.upper()
+    stocks, rows = _search_matches(
+        (np.char.find(_SEARCH_INDEX['symbol_name'], query_upper) >= 0)
+        | np.char.startswith(_SEARCH_INDEX['code'], query)
+    )
     
-    for stock in stocks:
-        symbol = stock.get('symbol', '').upper()
-        name = stock.get('name', '').upper()
-        code = stock.get('code', '').upper()
-        
-        if (query.upper() in symbol or 
-            query.upper() in name or 
-            code.startswith(query)):
-            results.append(stock)
-    
-    return jsonify({
+    return json_response({
         'success': True,
         'query': query,
-        'count': len(results),
-        'results': results[:50]  # 限制最多返回50个
+        'count': len(rows),
+        'results': stocks.iloc[rows[:50]].to_dict(orient='records')  # 限制最多返回50个
     })
 
 @app.route('/api/stocks/update', methods=['POST'])
 def update_stocks():
     """手动更新股票列表"""
     try:
-        success = fetch_all_stocks()
+        with _UPDATE_LOCK:
+            success = fetch_all_stocks()
+        analysis_cache.clear()
         
         if success:
-            return jsonify({
+            return json_response({
                 'success': True,
                 'message': f'股票列表更新成功，共 {len(ALL_STOCKS)} 只股票',
                 'last_update': LAST_UPDATE_TIME.isoformat() if LAST_UPDATE_TIME else None
             })
         else:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'message': '股票列表更新失败，使用后备数据',
                 'stocks_count': len(ALL_STOCKS)
             })
             
     except Exception as e:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 @app.route('/api/analyze', methods=['GET'])
 def analyze_stock():
@@ -619,43 +731,50 @@ def analyze_stock():
     period = request.args.get('period', '120')
     
     if not stock_code:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': '请提供股票代码参数: code=sh600519'
-        }), 400
+        }, 400)
     
     try:
         period_days = int(period)
         if period_days < 30 or period_days > 500:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': '分析周期需在30-500天之间'
-            }), 400
+            }, 400)
+        
+        # 缓存命中时跳过数据获取和指标计算
+        cache_key = (stock_code, period_days)
+        result = analysis_cache.get(cache_key)
+        if result is not None:
+            return json_response(result)
         
-        analyzer = StockSignalAnalyzer(stock_code, period_days)
+        analyzer = StockSignalAnalyzer(stock_code, period_days).fetch()
         
-        if analyzer.df.empty:
-            return jsonify({
+        if not analyzer.n_days:
+            return json_response({
                 'success': False,
                 'error': f'无法获取股票 {stock_code} 的数据'
-            }), 404
+            }, 404)
         
         if not analyzer.calculate_all_indicators():
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': '数据不足，无法计算技术指标'
-            }), 400
+            }, 400)
         
         result = analyzer.analyze()
         result['success'] = True
+        analysis_cache.set(cache_key, result)
         
-        return jsonify(result)
+        return json_response(result)
     
     except Exception as e:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': f'分析过程中出错: {str(e)}'
-        }), 500
+        }, 500)
 
 @app.route('/api/batch_analyze', methods=['POST'])
 def batch_analyze():
@@ -663,39 +782,33 @@ def batch_analyze():
     try:
         data = request.get_json()
         if not data or 'stocks' not in data:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': '请提供stocks数组参数'
-            }), 400
+            }, 400)
         
         stocks = data['stocks']
         period = data.get('period', 120)
         
         if not isinstance(stocks, list) or len(stocks) == 0:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': 'stocks必须是非空数组'
-            }), 400
+            }, 400)
         
         if len(stocks) > 20:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': '单次最多分析20只股票'
-            }), 400
+            }, 400)
         
-        results = []
-        for stock_code in stocks:
-            analyzer = StockSignalAnalyzer(stock_code, period)
-            if not analyzer.df.empty:
-                analyzer.calculate_all_indicators()
-                result = analyzer.analyze()
-                if 'error' not in result:
-                    results.append(result)
+        # 并发获取数据，按矩阵批量计算指标
+        results = [r for r in analyze_stocks(stocks, period) if r is not None]
         
         # 按信心分数排序
         results.sort(key=lambda x: x['analysis']['confidence_score'], reverse=True)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'count': len(results),
             'stocks_analyzed': len(results),
@@ -704,10 +817,10 @@ def batch_analyze():
         })
     
     except Exception as e:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': f'批量分析出错: {str(e)}'
-        }), 500
+        }, 500)
 
 @app.route('/api/market_overview', methods=['GET'])
 def market_overview():
@@ -721,28 +834,20 @@ def market_overview():
     ]
     
     results = []
-    for idx in indices:
-        try:
-            analyzer = StockSignalAnalyzer(idx['code'], 60)
-            if not analyzer.df.empty:
-                analyzer.calculate_all_indicators()
-                result = analyzer.analyze()
-                
-                if 'error' not in result:
-                    results.append({
-                        'name': idx['name'],
-                        'code': idx['code'],
-                        'price': result['current_price'],
-                        'change': result['price_change'],
-                        'signal': result['analysis']['signal'],
-                        'confidence': result['analysis']['confidence_score']
-                    })
-        except:
-            continue
+    for idx, result in zip(indices, analyze_stocks([idx['code'] for idx in indices], 60)):
+        if result is not None:
+            results.append({
+                'name': idx['name'],
+                'code': idx['code'],
+                'price': result['current_price'],
+                'change': result['price_change'],
+                'signal': result['analysis']['signal'],
+                'confidence': result['analysis']['confidence_score']
+            })
     
     market_sentiment = 'bullish' if len([r for r in results if r['signal'] in ['买入', '强烈买入']]) > len(results)/2 else 'bearish'
     
-    return jsonify({
+    return json_response({
         'success': True,
         'timestamp': datetime.now().isoformat(),
         'market_sentiment': market_sentiment,
@@ -765,24 +870,29 @@ def historical_data(code):
         df = get_price(code, frequency='1d', count=days)
         
         if df.empty:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': '无法获取历史数据'
-            }), 404
-        
-        # 转换为列表格式
-        data = []
-        for idx, row in df.iterrows():
-            data.append({
-                'date': idx.strftime('%Y-%m-%d'),
-                'open': round(row['open'], 2),
-                'close': round(row['close'], 2),
-                'high': round(row['high'], 2),
-                'low': round(row['low'], 2),
-                'volume': int(row['volume'])
-            })
+            }, 404)
+        
+        # 整列转换（保留两位小数、成交量取整），不逐行遍历
+        columns = {
+            'date': df.index.strftime('%Y-%m-%d').tolist(),
+            'open': df['open'].to_numpy(dtype=np.float64).round(2),
+            'close': df['close'].to_numpy(dtype=np.float64).round(2),
+            'high': df['high'].to_numpy(dtype=np.float64).round(2),
+            'low': df['low'].to_numpy(dtype=np.float64).round(2),
+            'volume': df['volume'].to_numpy(dtype=np.float64).astype(np.int64)
+        }
         
-        return jsonify({
+        if request.args.get('format') == 'columns':
+            # 列式格式：{字段: 数组}，numpy 数组由 orjson 直接序列化，不生成逐行字典
+            data = columns
+        else:
+            # 默认仍为逐行字典列表
+            data = pd.DataFrame(columns).to_dict(orient='records')
+        
+        return json_response({
             'success': True,
             'stock_code': code,
             'period_days': days,
@@ -790,16 +900,16 @@ def historical_data(code):
         })
     
     except Exception as e:
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'service': 'Stock Analysis API',
         'version': '1.0.0',
@@ -810,7 +920,7 @@ def health_check():
 @app.route('/api/supported_codes', methods=['GET'])
 def supported_codes():
     """支持的股票代码格式"""
-    return jsonify({
+    return json_response({
         'success': True,
         'formats': [
             'sh000001 - 上证指数',
@@ -827,23 +937,30 @@ def supported_codes():
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return json_response({
         'success': False,
         'error': 'API端点不存在'
-    }), 404
+    }, 404)
 
 @app.errorhandler(500)
 def internal_error(error):
-    return jsonify({
+    return json_response({
         'success': False,
         'error': '服务器内部错误'
-    }), 500
+    }, 500)
 
 # ==================== 启动应用 ====================
 
 if __name__ == '__main__':
     print("🚀 股票分析API服务启动中...")
 
+    # 生产环境使用 gunicorn 多进程 + 多线程 worker，开发服务器只在 DEV=1 时启动
+    if not os.environ.get('DEV'):
+        print("💡 生产环境请使用: gunicorn -c gunicorn_conf_app2.py")
+        print("   开发调试: DEV=1 python app2.py")
+        raise SystemExit(0)
+
+    # 以下为开发模式（DEV=1）
     # 初始加载股票列表
     print("📋 正在加载股票列表...")
     fetch_all_stocks()
@@ -865,4 +982,4 @@ if __name__ == '__main__':
     print("  http://localhost:8899/api/analyze?code=sh600519")
     print("  http://localhost:8899/api/analyze?code=sh600519&period=90")
     print(f"\n📈 当前股票数量: {len(ALL_STOCKS)} 只")
-    app.run(host='0.0.0.0', port=8899, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=8899, debug=True, use_reloader=False)
\ No newline at end of file
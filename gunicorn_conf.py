@@ -0,0 +1,35 @@
+# gunicorn_conf.py
+# 启动: gunicorn -c gunicorn_conf.py app:app（python app.py 也会以此配置启动）
+import os
+
+bind = '0.0.0.0:8988'
+
+# 预加载应用后再 fork，只读的全局数据（股票列表等）通过写时复制在 worker 间共享；
+# 线程池和批量分析进程池在 worker 内按需创建（fork 和 gevent 补丁之后），批量任务全局同一时间只运行一个
+preload_app = True
+workers = max(2, os.cpu_count() or 1)
+
+# gevent 协程 worker，网络等待（行情接口）期间可以处理其他请求
+worker_class = 'gevent'
+worker_connections = 200
+
+
+def when_ready(server):
+    """主进程就绪：初始化数据目录、加载股票池并预热分析流程（fork 后各 worker 共享）"""
+    from app import DATA_DIR, load_stock_universe, warm_up_analyzer
+
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
+
+    load_stock_universe()
+    warm_up_analyzer()
+
+
+def post_worker_init(worker):
+    """只有拿到文件锁的 worker 运行定时任务；该 worker 退出后锁释放，新 worker 接手"""
+    from app import start_scheduler_once
+
+    if start_scheduler_once() is None:
+        return
+
+    worker.log.info(f"worker {worker.pid} 负责运行定时分析任务")
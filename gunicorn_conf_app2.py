@@ -0,0 +1,29 @@
+# gunicorn_conf_app2.py
+# 启动: gunicorn -c gunicorn_conf_app2.py
+import os
+
+wsgi_app = 'app2:app'
+bind = '0.0.0.0:8899'
+
+# 预加载应用后再 fork，股票列表在主进程加载一次，通过写时复制在 worker 间共享
+preload_app = True
+workers = max(2, os.cpu_count() or 1)
+
+# 多线程 worker，网络等待（行情接口）期间同一进程的其他线程继续处理请求
+worker_class = 'gthread'
+threads = 16
+
+
+def when_ready(server):
+    """主进程就绪：加载股票列表（fork 后各 worker 共享）"""
+    from app2 import fetch_all_stocks
+
+    fetch_all_stocks()
+
+
+def post_worker_init(worker):
+    """线程不会随 fork 复制，每个 worker 启动自己的更新线程，各自的股票列表都按时更新"""
+    import threading
+    from app2 import auto_update_stocks
+
+    threading.Thread(target=auto_update_stocks, daemon=True).start()
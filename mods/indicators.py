@@ -0,0 +1,636 @@
+# indicators.py
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # 未安装 numba 时按普通 Python 函数执行
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # 未安装 scipy 时 EMA 使用 Python 递推
+    lfilter = None
+
+
+def _windows(x: np.ndarray, window: int) -> np.ndarray:
+    """沿最后一维切成长度为 window 的滑动窗口视图（不复制数据）"""
+    return sliding_window_view(np.asarray(x, dtype=np.float64), window, axis=-1)
+
+
+def _pad(values: np.ndarray, shape: tuple) -> np.ndarray:
+    """在最后一维前面补 NaN 到原长度，与 pandas rolling 的输出对齐"""
+    out = np.full(shape, np.nan)
+    out[..., shape[-1] - values.shape[-1]:] = values
+    return out
+
+
+def _flat(windows: np.ndarray) -> np.ndarray:
+    """每个窗口内的数值是否全部相同（含 NaN 的窗口为 False）"""
+    return windows.max(axis=-1) == windows.min(axis=-1)
+
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    滑动平均，等价于 pd.Series(x).rolling(window).mean()
+
+    Args:
+        x: 一维序列，或 (股票数, 天数) 的二维矩阵（沿最后一维计算）
+        window: 窗口长度
+
+    Returns:
+        与 x 同形状的数组，前 window-1 个为 NaN
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    windows = _windows(x, window)
+    # 窗口内数值全部相同（停牌、涨跌停封板）时直接取该值，与 pandas 一致，不受求和舍入误差影响
+    mean = np.where(_flat(windows), windows[..., 0], windows.mean(axis=-1))
+    return _pad(mean, x.shape)
+
+
+def rolling_std(x: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+    """滑动标准差，默认 ddof=1 与 pandas rolling().std() 一致（窗口内数值全部相同时恰好为 0）"""
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    windows = _windows(x, window)
+    std = np.where(_flat(windows), 0.0, windows.std(axis=-1, ddof=ddof))
+    return _pad(std, x.shape)
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    """滑动最小值"""
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    return _pad(_windows(x, window).min(axis=-1), x.shape)
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    """滑动最大值"""
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    return _pad(_windows(x, window).max(axis=-1), x.shape)
+
+
+@njit(cache=True, fastmath=True)
+def ewma_adjust_false(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    指数加权移动平均，等价于 pd.Series(x).ewm(alpha=alpha, adjust=False).mean()
+
+    adjust=False 即一阶递推 y[i] = alpha * x[i] + (1 - alpha) * y[i-1]
+
+    Args:
+        x: 一维 float64 序列（不含 NaN）
+        alpha: 平滑系数，span 对应 2 / (span + 1)
+
+    Returns:
+        与 x 等长的数组
+    """
+    out = np.empty_like(x)
+    if len(x) == 0:
+        return out
+    out[0] = x[0]
+    for i in range(1, len(x)):
+        out[i] = alpha * x[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def make_ewma(alpha: float):
+    """
+    生成固定平滑系数的 EWMA 函数
+
+    alpha 作为闭包常量参与编译（安装 numba 时），编译器可以针对该常量优化循环
+
+    Args:
+        alpha: 平滑系数
+
+    Returns:
+        函数 f(x) -> 与 x 等长的数组
+    """
+    beta = 1.0 - alpha
+    
+    @njit(cache=False, fastmath=True)
+    def _ewma(x):
+        out = np.empty_like(x)
+        if len(x) == 0:
+            return out
+        out[0] = x[0]
+        for i in range(1, len(x)):
+            out[i] = alpha * x[i] + beta * out[i - 1]
+        return out
+    
+    return _ewma
+
+
+# MACD 固定使用的周期，模块加载时生成专用函数
+_EMA_KERNELS = {span: make_ewma(2.0 / (span + 1)) for span in (12, 26, 9)}
+
+
+def _ewma_rows(x: np.ndarray, alpha: float) -> np.ndarray:
+    """二维矩阵逐行 EWMA：按天递推，每一步对所有股票做向量运算"""
+    beta = 1.0 - alpha
+    out = np.empty_like(x)
+    if x.shape[-1] == 0:
+        return out
+    out[:, 0] = x[:, 0]
+    for i in range(1, x.shape[-1]):
+        out[:, i] = alpha * x[:, i] + beta * out[:, i - 1]
+    return out
+
+
+def _ewma_list(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    未安装 numba 时的一维 EMA 递推
+
+    与 ewma_adjust_false 相同的递推，在 Python float 列表上循环，
+    避免逐个读写 numpy 元素的装箱开销（约快 3 倍，结果逐位相同）
+    """
+    beta = 1.0 - alpha
+    values = x.tolist()
+    if not values:
+        return np.empty(0)
+    prev = values[0]
+    out = [prev]
+    for value in values[1:]:
+        prev = alpha * value + beta * prev
+        out.append(prev)
+    return np.array(out)
+
+
+def _ewma_lfilter(x: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    用 scipy 的一阶 IIR 滤波实现 EMA（C 实现，二维矩阵按行一次完成）
+
+    y[i] = alpha * x[i] + (1 - alpha) * y[i-1] 即 lfilter([alpha], [1, alpha - 1])，
+    初始状态取 (1 - alpha) * x[0] 使 y[0] = x[0]，与 adjust=False 一致（差异在浮点舍入级别）
+    """
+    if x.shape[-1] == 0:
+        return np.empty_like(x)
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, axis=-1, zi=(1.0 - alpha) * x[..., :1])
+    return y
+
+
+def ema(x: np.ndarray, span: int) -> np.ndarray:
+    """按周期计算 EMA，等价于 ewm(span=span, adjust=False).mean()；二维矩阵按行计算"""
+    x = np.asarray(x, dtype=np.float64)
+    alpha = 2.0 / (span + 1)
+    if x.ndim == 2:
+        return _ewma_lfilter(x, alpha) if lfilter is not None else _ewma_rows(x, alpha)
+    if not NUMBA_AVAILABLE:
+        return _ewma_lfilter(x, alpha) if lfilter is not None else _ewma_list(x, alpha)
+    kernel = _EMA_KERNELS.get(span)
+    if kernel is not None:
+        return kernel(x)
+    return ewma_adjust_false(x, alpha)
+
+
+@njit(cache=True)
+def _rsi_1d(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    RSI（涨跌幅按 period 日简单平均），一次遍历完成
+
+    等价于 diff -> 涨跌拆分 -> rolling(period).mean() -> 100 - 100 / (1 + rs) 的多步 pandas 计算，
+    第一个差分按 0 计入窗口
+
+    Args:
+        close: 收盘价序列
+        period: 平均周期
+
+    Returns:
+        与 close 等长的数组，前 period-1 个为 NaN
+    """
+    n = len(close)
+    out = np.full(n, np.nan)
+    gains = np.zeros(n)
+    losses = np.zeros(n)
+    gain_sum = 0.0
+    loss_sum = 0.0
+    
+    for i in range(n):
+        if i > 0:
+            delta = close[i] - close[i - 1]
+            if delta > 0:
+                gains[i] = delta
+            elif delta < 0:
+                losses[i] = -delta
+        gain_sum += gains[i]
+        loss_sum += losses[i]
+        if i >= period:
+            gain_sum -= gains[i - period]
+            loss_sum -= losses[i - period]
+        if i >= period - 1:
+            if loss_sum > 0:
+                out[i] = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+            elif gain_sum > 0:
+                out[i] = 100.0
+    return out
+
+
+def _window_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """沿最后一维的窗口和（累加和相减），第 i 个元素为 x[..., i-window+1 : i+1] 之和，前 window-1 个无意义"""
+    csum = np.cumsum(x, axis=-1)
+    out = csum.copy()
+    out[..., window:] -= csum[..., :-window]
+    return out
+
+
+def _rsi_vectorized(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    RSI 的整列向量实现（未安装 numba 时使用，一维或按行的二维）
+
+    涨跌拆分用 np.where，窗口和用累加和相减；窗口内是否有涨/跌按计数判断（整数精确），
+    累加和相减的舍入残差不会把"全为 0"的窗口误判为有涨跌，与 _rsi_1d 的结果一致
+    """
+    n = close.shape[-1]
+    out = np.full(close.shape, np.nan)
+    if n < period:
+        return out
+    
+    delta = np.zeros(close.shape)
+    delta[..., 1:] = close[..., 1:] - close[..., :-1]
+    gain_sum = _window_sum(np.where(delta > 0, delta, 0.0), period)[..., period - 1:]
+    loss_sum = _window_sum(np.where(delta < 0, -delta, 0.0), period)[..., period - 1:]
+    gain_cnt = _window_sum((delta > 0).astype(np.int64), period)[..., period - 1:]
+    loss_cnt = _window_sum((delta < 0).astype(np.int64), period)[..., period - 1:]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+    out[..., period - 1:] = np.where(loss_cnt > 0, value, np.where(gain_cnt > 0, 100.0, np.nan))
+    return out
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI，一维序列或 (股票数, 天数) 的二维矩阵（按行计算）"""
+    close = np.asarray(close, dtype=np.float64)
+    if close.ndim == 2 or not NUMBA_AVAILABLE:
+        return _rsi_vectorized(close, period)
+    return _rsi_1d(close, period)
+
+
+# signal_indicators 返回的指标（融合内核输出矩阵的行顺序）
+SIGNAL_COLUMNS = ('MA5', 'MA10', 'MA20', 'MA30', 'MA60',
+                  'MACD', 'MACD_signal', 'MACD_hist', 'RSI',
+                  'BB_middle', 'BB_upper', 'BB_lower', 'BB_position',
+                  'volume_ma5', 'volume_ratio', '%K', '%D')
+
+
+# 每个线程复用的内核临时缓冲区（涨幅、跌幅两行），批量分析时不再每只股票重新分配
+_SCRATCH = threading.local()
+
+
+def _scratch(n: int) -> np.ndarray:
+    """当前线程的 (2, >=n) 临时缓冲区，长度不够时重新分配"""
+    buf = getattr(_SCRATCH, 'buf', None)
+    if buf is None or buf.shape[1] < n:
+        buf = _SCRATCH.buf = np.empty((2, max(n, 256)))
+    return buf
+
+
+@njit(cache=True, error_model='numpy')
+def _fused_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                      volume: np.ndarray, out: np.ndarray, scratch: np.ndarray) -> None:
+    """
+    单只股票的全部信号指标，一次按天遍历完成
+
+    每天依次更新均线、EMA 递推、RSI 涨跌累计、布林带、成交量和 KD，
+    数据只读一遍，不产生中间数组；窗口内的和、极值、方差直接按窗口计算（窗口最长 60）
+
+    Args:
+        close, high, low, volume: 行情序列
+        out: 输出矩阵 (len(SIGNAL_COLUMNS), 天数)，行顺序同 SIGNAL_COLUMNS，由内核填满
+        scratch: (2, >=天数) 的临时缓冲区，内容会被覆盖
+    """
+    n = len(close)
+    out[:, :] = np.nan
+    windows = np.array([5, 10, 20, 30, 60])
+    a12, a26, a9 = 2.0 / 13, 2.0 / 27, 2.0 / 10
+    b12, b26, b9 = 1.0 - a12, 1.0 - a26, 1.0 - a9
+    e12 = 0.0
+    e26 = 0.0
+    signal = 0.0
+    gains = scratch[0]
+    losses = scratch[1]
+    gain_sum = 0.0
+    loss_sum = 0.0
+    
+    for i in range(n):
+        c = close[i]
+        
+        # 移动平均线（窗口内价格全部相同时直接取该价格，与 pandas 一致）
+        flat20 = False
+        for j in range(5):
+            w = windows[j]
+            if i >= w - 1:
+                total = 0.0
+                flat = True
+                for k in range(i - w + 1, i + 1):
+                    total += close[k]
+                    flat = flat and close[k] == c
+                out[j, i] = c if flat else total / w
+                if j == 2:
+                    flat20 = flat
+        
+        # MACD（adjust=False 的 EMA 递推）
+        if i == 0:
+            e12 = c
+            e26 = c
+        else:
+            e12 = a12 * c + b12 * e12
+            e26 = a26 * c + b26 * e26
+        macd = e12 - e26
+        signal = macd if i == 0 else a9 * macd + b9 * signal
+        out[5, i] = macd
+        out[6, i] = signal
+        out[7, i] = macd - signal
+        
+        # RSI（14日涨跌幅简单平均，第一个差分按 0 计入）
+        gains[i] = 0.0
+        losses[i] = 0.0
+        if i > 0:
+            delta = c - close[i - 1]
+            if delta > 0:
+                gains[i] = delta
+            elif delta < 0:
+                losses[i] = -delta
+        gain_sum += gains[i]
+        loss_sum += losses[i]
+        if i >= 14:
+            gain_sum -= gains[i - 14]
+            loss_sum -= losses[i - 14]
+        if i >= 13:
+            if loss_sum > 0:
+                out[8, i] = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+            elif gain_sum > 0:
+                out[8, i] = 100.0
+        
+        # 布林带（20日，样本标准差）
+        if i >= 19:
+            middle = out[2, i]
+            std = 0.0
+            if not flat20:
+                sq = 0.0
+                for k in range(i - 19, i + 1):
+                    sq += (close[k] - middle) ** 2
+                std = np.sqrt(sq / 19)
+            upper = middle + (std * 2)
+            lower = middle - (std * 2)
+            out[9, i] = middle
+            out[10, i] = upper
+            out[11, i] = lower
+            out[12, i] = (c - lower) / (upper - lower)
+        
+        # 成交量
+        if i >= 4:
+            total = 0.0
+            flat = True
+            for k in range(i - 4, i + 1):
+                total += volume[k]
+                flat = flat and volume[k] == volume[i]
+            out[13, i] = volume[i] if flat else total / 5
+            out[14, i] = volume[i] / out[13, i]
+        
+        # KD指标
+        if i >= 13:
+            low_14 = low[i]
+            high_14 = high[i]
+            for k in range(i - 13, i):
+                low_14 = min(low_14, low[k])
+                high_14 = max(high_14, high[k])
+            out[15, i] = 100 * ((c - low_14) / (high_14 - low_14))
+        if i >= 15:
+            k0, k1, k2 = out[15, i - 2], out[15, i - 1], out[15, i]
+            out[16, i] = k2 if k0 == k1 == k2 else (k0 + k1 + k2) / 3
+
+
+def signal_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                      volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    计算信号分析所需的全部技术指标
+
+    输入可以是单只股票的一维序列，也可以是多只股票堆叠成的 (股票数, 天数) 矩阵，
+    矩阵时所有股票在同一次向量运算中完成
+
+    Args:
+        close: 收盘价
+        high: 最高价
+        low: 最低价
+        volume: 成交量
+
+    Returns:
+        {指标名: 与输入同形状的数组}
+    """
+    if NUMBA_AVAILABLE and np.ndim(close) == 1:
+        # 单只股票：编译后的融合内核一次遍历算完所有指标
+        close, high, low, volume = (np.asarray(x, dtype=np.float64) for x in (close, high, low, volume))
+        out = np.empty((len(SIGNAL_COLUMNS), len(close)))
+        _fused_indicators(close, high, low, volume, out, _scratch(len(close)))
+        return dict(zip(SIGNAL_COLUMNS, out))
+    
+    # 多只股票矩阵（或未安装 numba）：逐个指标做整列向量运算
+    cols = {}
+    
+    # 移动平均线
+    for window in [5, 10, 20, 30, 60]:
+        cols[f'MA{window}'] = rolling_mean(close, window)
+    
+    # MACD
+    cols['MACD'] = ema(close, 12) - ema(close, 26)
+    cols['MACD_signal'] = ema(cols['MACD'], 9)
+    cols['MACD_hist'] = cols['MACD'] - cols['MACD_signal']
+    
+    # RSI
+    cols['RSI'] = rsi(close, 14)
+    
+    # 布林带
+    bb_middle = cols['MA20']
+    bb_std = rolling_std(close, 20)
+    cols['BB_middle'] = bb_middle
+    cols['BB_upper'] = bb_middle + (bb_std * 2)
+    cols['BB_lower'] = bb_middle - (bb_std * 2)
+    cols['BB_position'] = (close - cols['BB_lower']) / (cols['BB_upper'] - cols['BB_lower'])
+    
+    # 成交量
+    cols['volume_ma5'] = rolling_mean(volume, 5)
+    cols['volume_ratio'] = volume / cols['volume_ma5']
+    
+    # KD指标
+    low_14 = rolling_min(low, 14)
+    high_14 = rolling_max(high, 14)
+    cols['%K'] = 100 * ((close - low_14) / (high_14 - low_14))
+    cols['%D'] = rolling_mean(cols['%K'], 3)
+    
+    return cols
+
+
+@njit(cache=True, error_model='numpy')
+def _risk_stats(returns: np.ndarray) -> Tuple[float, float, float]:
+    """
+    收益率的风险统计（跳过 NaN），编译后按顺序遍历，不产生中间数组
+
+    第一遍求均值，第二遍同时累计离差平方和、累计净值及其历史最高点，得到最大回撤
+    """
+    n = 0
+    total = 0.0
+    for r in returns:
+        if r == r:
+            n += 1
+            total += r
+    mean = total / n
+    
+    ss = 0.0
+    cumulative = 1.0
+    peak = -np.inf
+    max_dd = 0.0
+    for r in returns:
+        if r == r:
+            ss += (r - mean) ** 2
+            cumulative *= 1.0 + r
+            if cumulative > peak:
+                peak = cumulative
+            dd = (cumulative - peak) / peak
+            if dd < max_dd:
+                max_dd = dd
+    return np.sqrt(ss / (n - 1)), mean, max_dd
+
+
+def risk_stats(returns: np.ndarray) -> Tuple[float, float, float]:
+    """
+    收益率的 (标准差(ddof=1), 均值, 最大回撤)，NaN 不参与计算
+
+    最大回撤为累计净值相对此前最高点的最大跌幅（负数或 0）；
+    安装 numba 时用编译内核遍历两次完成，否则用 numpy 整列计算
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if NUMBA_AVAILABLE:
+        return _risk_stats(returns)
+    
+    returns = returns[~np.isnan(returns)]
+    cumulative = np.cumprod(1 + returns)
+    running_max = np.maximum.accumulate(cumulative)
+    max_dd = ((cumulative - running_max) / running_max).min()
+    return np.std(returns, ddof=1), returns.mean(), max_dd
+
+
+def ema_state(close: np.ndarray) -> Tuple[float, float, float]:
+    """整段序列最后一天的 (EMA12, EMA26, MACD信号线)，作为 latest_indicators 的递推起点"""
+    close = np.asarray(close, dtype=np.float64)
+    ema12 = ema(close, 12)
+    ema26 = ema(close, 26)
+    signal = ema(ema12 - ema26, 9)
+    return float(ema12[-1]), float(ema26[-1]), float(signal[-1])
+
+
+def latest_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray,
+                      prev_k: Tuple[float, float],
+                      prev_ema: Tuple[float, float, float]) -> Tuple[Dict[str, float], Tuple[float, float, float]]:
+    """
+    只计算最后一天的信号指标（实时追加K线时使用）
+
+    窗口类指标只看最后一个窗口的数据（同样用 rolling_mean/rolling_std，窗口内数值全部相同时结果精确），
+    EMA 从前一天的状态递推一步，每次更新的计算量与历史长度无关；结果与 signal_indicators 的最后一列一致
+
+    Args:
+        close, high, low, volume: 截止最新一天的序列（至少 60 天即可）
+        prev_k: 前两天的 %K，用于计算 %D
+        prev_ema: 前一天的 (EMA12, EMA26, MACD信号线)
+
+    Returns:
+        ({指标名: 数值}, 最新一天的 (EMA12, EMA26, MACD信号线))
+    """
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    n = len(close)
+    c = close[-1]
+    row = {}
+    
+    # 移动平均线
+    for window in [5, 10, 20, 30, 60]:
+        row[f'MA{window}'] = rolling_mean(close[-window:], window)[-1]
+    
+    # MACD
+    a12, a26, a9 = 2.0 / 13, 2.0 / 27, 2.0 / 10
+    ema12 = a12 * c + (1.0 - a12) * prev_ema[0]
+    ema26 = a26 * c + (1.0 - a26) * prev_ema[1]
+    row['MACD'] = ema12 - ema26
+    signal = a9 * row['MACD'] + (1.0 - a9) * prev_ema[2]
+    row['MACD_signal'] = signal
+    row['MACD_hist'] = row['MACD'] - signal
+    
+    # RSI
+    row['RSI'] = np.nan
+    if n >= 15:
+        delta = np.diff(close[-15:])
+        gain = delta[delta > 0].sum()
+        loss = -delta[delta < 0].sum()
+        if loss > 0:
+            row['RSI'] = 100.0 - 100.0 / (1.0 + gain / loss)
+        elif gain > 0:
+            row['RSI'] = 100.0
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 布林带
+        bb_middle = row['MA20']
+        bb_std = rolling_std(close[-20:], 20)[-1]
+        row['BB_middle'] = bb_middle
+        row['BB_upper'] = bb_middle + (bb_std * 2)
+        row['BB_lower'] = bb_middle - (bb_std * 2)
+        row['BB_position'] = (c - row['BB_lower']) / (row['BB_upper'] - row['BB_lower'])
+        
+        # 成交量
+        row['volume_ma5'] = rolling_mean(volume[-5:], 5)[-1]
+        row['volume_ratio'] = volume[-1] / row['volume_ma5']
+        
+        # KD指标
+        if n >= 14:
+            low_14 = low[-14:].min()
+            high_14 = high[-14:].max()
+            row['%K'] = 100 * ((c - low_14) / (high_14 - low_14))
+        else:
+            row['%K'] = np.nan
+        row['%D'] = rolling_mean(np.array([prev_k[0], prev_k[1], row['%K']]), 3)[-1]
+    
+    return {k: float(v) for k, v in row.items()}, (ema12, ema26, signal)
+
+
+def round_values(values: Sequence[float], decimals: Sequence[int]) -> List[float]:
+    """
+    一次舍入多个标量，每个值保留各自的小数位数，返回 Python float 列表
+
+    与 np.round 的算法相同（乘以 10**位数、rint、再除回），替代逐个调用 round
+    """
+    scale = 10.0 ** np.asarray(decimals, dtype=np.float64)
+    return (np.rint(np.asarray(values, dtype=np.float64) * scale) / scale).tolist()
+
+
+def warm_up() -> None:
+    """
+    用一段短序列调用一遍所有编译内核
+
+    numba 在首次调用时才编译（或从磁盘缓存加载），放在模块导入时完成，
+    第一次分析请求不再承担编译耗时；多进程 fork 出的 worker 直接继承编译结果
+    """
+    close = 10 + np.sin(np.arange(30, dtype=np.float64))
+    signal_indicators(close, close + 0.5, close - 0.5, np.full(30, 1e6))
+    for kernel in _EMA_KERNELS.values():
+        kernel(close)
+    ewma_adjust_false(close, 0.5)
+    _rsi_1d(close, 14)
+    _risk_stats(np.diff(close) / close[:-1])
+
+
+if NUMBA_AVAILABLE:
+    warm_up()
@@ -1,74 +1,197 @@
 # mods/news_monitor.py 修复版本
 
 import asyncio
-import json
+import hashlib
 import re
+import zlib
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Set
 import aiohttp
 from bs4 import BeautifulSoup
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from collections import defaultdict
-import schedule
-import time
-import threading
 import logging
-import redis
+import time
+import orjson
+import redis.asyncio as aioredis
+
+from mods.serialization import now_iso
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Redis配置
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+redis_client = aioredis.Redis(host='localhost', port=6379, db=0, decode_responses=True, max_connections=50)
+
+# 新闻通过 Redis 频道 news:{股票代码} 发布，每个 worker 订阅后推送给自己的 WebSocket 客户端
+NEWS_CHANNEL_PREFIX = "news:"
+_pubsub_ready = False  # 本进程的 Redis 订阅是否正常，否则直接在本进程内推送
+NEWS_SEEN_TTL = 3600  # 已推送新闻的去重记录保留时间（秒）
+
+def dumps(message: dict) -> str:
+    """序列化 WebSocket 消息（orjson，中文直接输出 UTF-8）"""
+    return orjson.dumps(message).decode()
 
 class ConnectionManager:
+    """
+    WebSocket 连接管理
+
+    每个连接有自己的发送队列和发送协程：推送只是入队，慢客户端不会阻塞其他客户端，
+    队列满（客户端处理不过来）时关闭该客户端的连接
+    """
+    SEND_QUEUE_SIZE = 1000
+    OVERFLOW_CLOSE_CODE = 1013  # 关闭码 1013 (Try Again Later)：服务端暂时无法为该客户端推送
+    COMPRESS_MIN_SIZE = 1024  # 超过该长度的广播消息对开启压缩的客户端发送 zlib 压缩的二进制帧
+    
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
-        self.stock_subscriptions: Dict[str, List[str]] = defaultdict(list)
+        self.stock_subscriptions: Dict[str, Set[str]] = defaultdict(set)
+        self.client_subscriptions: Dict[str, Set[str]] = defaultdict(set)  # 反向索引：客户端 -> 订阅的股票
+        self.send_queues: Dict[str, asyncio.Queue] = {}
+        self.writer_tasks: Dict[str, asyncio.Task] = {}
+        self.compress_clients: Set[str] = set()  # 订阅时声明 "compress": true 的客户端
+        self._closing: Set[asyncio.Task] = set()  # 进行中的关闭任务（保持引用，避免被回收）
         
     async def connect(self, websocket: WebSocket, client_id: str):
         await websocket.accept()
+        queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
         self.active_connections[client_id] = websocket
+        self.send_queues[client_id] = queue
+        self.writer_tasks[client_id] = asyncio.create_task(self._writer(client_id, websocket, queue))
         return client_id
+    
+    async def _writer(self, client_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """按顺序发送队列中的消息，发送失败时断开客户端"""
+        while True:
+            payload = await queue.get()
+            try:
+                if isinstance(payload, bytes):
+                    await websocket.send_bytes(payload)
+                else:
+                    await websocket.send_text(payload)
+            except Exception:
+                self.disconnect(client_id)
+                break
         
     def disconnect(self, client_id: str):
         if client_id in self.active_connections:
             del self.active_connections[client_id]
-        # 清理订阅
-        for stock_code in list(self.stock_subscriptions.keys()):
-            if client_id in self.stock_subscriptions[stock_code]:
-                self.stock_subscriptions[stock_code].remove(client_id)
+        self.send_queues.pop(client_id, None)
+        self.compress_clients.discard(client_id)
+        task = self.writer_tasks.pop(client_id, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        # 清理订阅（只遍历该客户端订阅过的股票）
+        for stock_code in self.client_subscriptions.pop(client_id, ()):
+            self._remove_subscriber(stock_code, client_id)
+    
+    def _enqueue(self, client_id: str, payload):
+        """放入客户端的发送队列，队列已满则断开该客户端并关闭其 WebSocket"""
+        queue = self.send_queues.get(client_id)
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning(f"客户端 {client_id} 发送队列已满，断开连接")
+            websocket = self.active_connections.get(client_id)
+            self.disconnect(client_id)
+            if websocket is not None:
+                task = asyncio.create_task(self._close(websocket, self.OVERFLOW_CLOSE_CODE))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+    
+    async def _close(self, websocket: WebSocket, code: int):
+        """带关闭码关闭连接，客户端已断开时忽略错误"""
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
                 
     async def send_personal_message(self, message: dict, client_id: str):
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_json(message)
-            except:
-                self.disconnect(client_id)
+        self._enqueue(client_id, dumps(message))
                 
     async def broadcast_to_subscribers(self, stock_code: str, message: dict):
-        if stock_code in self.stock_subscriptions:
-            for client_id in self.stock_subscriptions[stock_code]:
-                await self.send_personal_message(message, client_id)
+        """推送给订阅该股票的所有客户端：消息只序列化（和压缩）一次，放入各客户端的发送队列"""
+        if stock_code not in self.stock_subscriptions:
+            return
+        
+        await self.broadcast_payload(stock_code, dumps(message))
+    
+    async def broadcast_payload(self, stock_code: str, payload: str):
+        """推送已序列化的消息"""
+        if stock_code not in self.stock_subscriptions:
+            return
+        
+        compressed = None
+        for client_id in list(self.stock_subscriptions[stock_code]):
+            if client_id in self.compress_clients and len(payload) > self.COMPRESS_MIN_SIZE:
+                if compressed is None:
+                    compressed = zlib.compress(payload.encode(), 1)
+                self._enqueue(client_id, compressed)
+            else:
+                self._enqueue(client_id, payload)
                 
     def subscribe(self, client_id: str, stock_code: str):
         if client_id in self.active_connections:
-            if stock_code not in self.stock_subscriptions:
-                self.stock_subscriptions[stock_code] = []
-            if client_id not in self.stock_subscriptions[stock_code]:
-                self.stock_subscriptions[stock_code].append(client_id)
+            self.stock_subscriptions[stock_code].add(client_id)
+            self.client_subscriptions[client_id].add(stock_code)
                 
     def unsubscribe(self, client_id: str, stock_code: str):
-        if stock_code in self.stock_subscriptions:
-            if client_id in self.stock_subscriptions[stock_code]:
-                self.stock_subscriptions[stock_code].remove(client_id)
+        if client_id in self.client_subscriptions:
+            self.client_subscriptions[client_id].discard(stock_code)
+        self._remove_subscriber(stock_code, client_id)
+    
+    def _remove_subscriber(self, stock_code: str, client_id: str):
+        """移除订阅者，股票没有订阅者后删除该股票（定时检查不再爬取）"""
+        subscribers = self.stock_subscriptions.get(stock_code)
+        if subscribers is not None:
+            subscribers.discard(client_id)
+            if not subscribers:
+                del self.stock_subscriptions[stock_code]
 
 manager = ConnectionManager()
 
+class RateLimiter:
+    """
+    令牌桶：每 period 秒最多 rate 次
+
+    令牌按时间连续补充，最多攒 rate 个；try_acquire 取不到令牌时立即返回 False
+    """
+    
+    def __init__(self, rate: float, period: float = 1.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+        self._updated = now
+    
+    def try_acquire(self) -> bool:
+        """有令牌时取走一个并返回 True，否则返回 False"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+app = FastAPI(title="新闻监控API")
+
+CHECK_INTERVAL = 60  # 定时检查新闻的间隔（秒）
+HEARTBEAT_TIMEOUT = 60  # 客户端超过该时间（秒）无消息时发送心跳
+CRAWL_CONCURRENCY = 10  # 同时进行的爬取数量上限
+_CRAWL_SEM = asyncio.Semaphore(CRAWL_CONCURRENCY)
+
+# 入站限速：每个客户端 IP 每秒最多 CLIENT_CRAWL_LIMIT 次立即爬取请求
+CLIENT_CRAWL_LIMIT = 2
+_CLIENT_LIMITERS: Dict[str, RateLimiter] = {}
+
 # 数据模型
 class StockRequest(BaseModel):
     stock_codes: List[str]
@@ -96,6 +219,8 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
         
         if data.get("type") == "subscribe":
             stock_codes = data.get("stock_codes", [])
+            if data.get("compress"):
+                manager.compress_clients.add(client_id)
             
             for stock_code in stock_codes:
                 manager.subscribe(client_id, stock_code)
@@ -103,35 +228,36 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             logger.info(f"客户端 {client_id} 订阅了 {stock_codes}")
             
             # 发送确认消息
-            await websocket.send_json({
+            await manager.send_personal_message({
                 "type": "connected",
                 "message": f"已订阅 {len(stock_codes)} 只股票的实时新闻",
                 "stock_codes": stock_codes,
-                "timestamp": datetime.now().isoformat()
-            })
+                "timestamp": now_iso()
+            }, client_id)
             
             # 保持连接
             while True:
                 try:
                     # 心跳检测
-                    data = await websocket.receive_json(timeout=60)
+                    data = await asyncio.wait_for(websocket.receive_json(), timeout=HEARTBEAT_TIMEOUT)
                     if data.get("type") == "ping":
-                        await websocket.send_json({
+                        await manager.send_personal_message({
                             "type": "pong",
-                            "timestamp": datetime.now().isoformat()
-                        })
+                            "timestamp": now_iso()
+                        }, client_id)
                 except WebSocketDisconnect:
                     logger.info(f"客户端 {client_id} 断开连接")
                     break
+                except asyncio.CancelledError:
+                    raise
                 except asyncio.TimeoutError:
-                    # 发送心跳检测
-                    try:
-                        await websocket.send_json({
-                            "type": "ping",
-                            "timestamp": datetime.now().isoformat()
-                        })
-                    except:
+                    # 发送心跳检测（发送失败时发送协程会断开客户端）
+                    if client_id not in manager.active_connections:
                         break
+                    await manager.send_personal_message({
+                        "type": "ping",
+                        "timestamp": now_iso()
+                    }, client_id)
                 except Exception as e:
                     logger.error(f"WebSocket接收错误: {e}")
                     break
@@ -167,20 +293,21 @@ async def start_crawling(request: StockRequest, background_tasks: BackgroundTask
 
 @app.get("/api/crawl/single")
 async def crawl_single_stock(
+    request: Request,
     stock_code: str = Query(..., description="股票代码"),
     stock_name: Optional[str] = Query(None, description="股票名称")
 ):
     """立即爬取单只股票的新闻"""
+    if not _client_allowed(request):
+        raise HTTPException(status_code=429, detail="请求过于频繁，请稍后再试")
+    
     try:
         # 这里调用你的爬取函数
         news_items = await mock_crawl_news(stock_code, stock_name)
         
         # 推送给订阅者
         for news in news_items:
-            await manager.broadcast_to_subscribers(stock_code, {
-                "type": "news",
-                "data": news.dict()
-            })
+            await publish_news(stock_code, news_payload(news))
         
         return JSONResponse({
             "status": "success",
@@ -199,9 +326,68 @@ async def test_api():
         "status": "success",
         "message": "新闻监控API运行正常",
         "websocket_clients": len(manager.active_connections),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     })
 
+def _client_allowed(request: Request) -> bool:
+    """按客户端 IP 限速，超出时返回 False"""
+    if request.client is None:
+        return True
+    limiter = _CLIENT_LIMITERS.get(request.client.host)
+    if limiter is None:
+        if len(_CLIENT_LIMITERS) >= 10000:
+            _CLIENT_LIMITERS.clear()  # 防止 IP 过多时无限增长，清空后各 IP 令牌重新计满
+        limiter = _CLIENT_LIMITERS[request.client.host] = RateLimiter(CLIENT_CRAWL_LIMIT, 1)
+    return limiter.try_acquire()
+
+def news_payload(news: NewsItem) -> str:
+    """新闻推送消息：model_dump_json 直接输出 JSON，拼接外层结构，不再经过 dict 转换"""
+    return f'{{"type":"news","data":{news.model_dump_json()}}}'
+
+async def publish_news(stock_code: str, payload: str):
+    """发布已序列化的新闻消息：Redis 可用时发布到频道，由所有 worker 推送；否则只在本进程内推送"""
+    if _pubsub_ready:
+        try:
+            await redis_client.publish(f"{NEWS_CHANNEL_PREFIX}{stock_code}", payload)
+            return
+        except Exception as e:
+            logger.warning(f"Redis 发布失败，改为本地推送: {e}")
+    await manager.broadcast_payload(stock_code, payload)
+
+async def is_new_news(stock_code: str, news: NewsItem) -> bool:
+    """按新闻链接去重：在 Redis 中记录已推送的新闻，NEWS_SEEN_TTL 内重复爬到的不再推送"""
+    if not _pubsub_ready:
+        return True  # Redis 不可用时不去重
+    
+    digest = hashlib.blake2b(news.url.encode(), digest_size=8).hexdigest()
+    try:
+        added = await redis_client.set(f"news:seen:{stock_code}:{digest}", 1, nx=True, ex=NEWS_SEEN_TTL)
+    except Exception:
+        return True
+    return bool(added)
+
+async def _redis_listener():
+    """订阅所有新闻频道并推送给本进程的客户端，断线后5秒重连"""
+    global _pubsub_ready
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{NEWS_CHANNEL_PREFIX}*")
+            _pubsub_ready = True
+            async for msg in pubsub.listen():
+                if msg["type"] != "pmessage":
+                    continue
+                stock_code = msg["channel"][len(NEWS_CHANNEL_PREFIX):]
+                await manager.broadcast_payload(stock_code, msg["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis 订阅中断，5秒后重连: {e}")
+        finally:
+            _pubsub_ready = False
+            await pubsub.aclose()
+        await asyncio.sleep(5)
+
 # 模拟爬取函数（替换为你的实际爬取逻辑）
 async def mock_crawl_news(stock_code: str, stock_name: Optional[str] = None) -> List[NewsItem]:
     """模拟爬取新闻数据"""
@@ -209,59 +395,77 @@ async def mock_crawl_news(stock_code: str, stock_name: Optional[str] = None) ->
     
     news_items = []
     sources = ["东方财富", "新浪财经", "同花顺", "雪球"]
+    now = datetime.now()
+    crawl_time = now.strftime("%Y-%m-%d %H:%M:%S")
     
     for i in range(2):  # 模拟2条新闻
-        news = NewsItem(
+        # 字段来自内部爬取代码，类型已确定，跳过 Pydantic 校验
+        news = NewsItem.model_construct(
             title=f"{stock_name}最新动态({i+1})",
             content=f"这是{stock_name}({stock_code})的最新新闻内容...",
             source=sources[i % len(sources)],
-            publish_time=(datetime.now() - timedelta(minutes=i*5)).strftime("%Y-%m-%d %H:%M:%S"),
+            publish_time=(now - timedelta(minutes=i*5)).strftime("%Y-%m-%d %H:%M:%S"),
             stock_code=stock_code,
             stock_name=stock_name,
             url=f"https://example.com/news/{stock_code}/{i}",
-            crawl_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            crawl_time=crawl_time
         )
         news_items.append(news)
     
     return news_items
 
+async def _bounded_crawl(stock_code: str, stock_name: Optional[str] = None) -> List[NewsItem]:
+    """限制并发数的爬取"""
+    async with _CRAWL_SEM:
+        return await mock_crawl_news(stock_code, stock_name)
+
 async def crawl_stocks_task(stock_codes: List[str], stock_names: Optional[List[str]] = None):
-    """后台爬取任务"""
-    for i, stock_code in enumerate(stock_codes):
-        stock_name = stock_names[i] if stock_names and i < len(stock_names) else None
+    """后台爬取任务（并发爬取，单只股票失败不影响其他股票）"""
+    names = [stock_names[i] if stock_names and i < len(stock_names) else None
+             for i in range(len(stock_codes))]
+    results = await asyncio.gather(
+        *(_bounded_crawl(code, name) for code, name in zip(stock_codes, names)),
+        return_exceptions=True
+    )
+    
+    for stock_code, news_items in zip(stock_codes, results):
+        if isinstance(news_items, Exception):
+            logger.error(f"爬取{stock_code}失败: {news_items}")
+            continue
         try:
-            news_items = await mock_crawl_news(stock_code, stock_name)
-            
             for news in news_items:
-                await manager.broadcast_to_subscribers(stock_code, {
-                    "type": "news",
-                    "data": news.dict()
-                })
+                if not await is_new_news(stock_code, news):
+                    continue
+                await publish_news(stock_code, news_payload(news))
                 
                 logger.info(f"推送新闻: {stock_code} - {news.title}")
                 
         except Exception as e:
-            logger.error(f"爬取{stock_code}失败: {e}")
+            logger.error(f"推送{stock_code}新闻失败: {e}")
 
 # 启动函数
-def start_monitor():
+async def _periodic_check():
+    """每隔 CHECK_INTERVAL 秒检查一次新闻（运行在事件循环中，不占用额外线程）"""
+    while True:
+        await check_news()
+        await asyncio.sleep(CHECK_INTERVAL)
+
+@app.on_event("startup")
+async def start_monitor():
     """启动新闻监控"""
     logger.info("启动新闻监控服务...")
-    
-    # 这里可以添加定时任务
-    def run_scheduler():
-        schedule.every(1).minute.do(lambda: asyncio.create_task(check_news()))
-        
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
-    
-    # 启动调度器线程
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-    
+    app.state.redis_task = asyncio.create_task(_redis_listener())
+    app.state.news_task = asyncio.create_task(_periodic_check())
     logger.info("新闻监控服务已启动")
 
+@app.on_event("shutdown")
+async def stop_monitor():
+    """停止新闻监控"""
+    for name in ("news_task", "redis_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+
 async def check_news():
     """定时检查新闻"""
     try:
@@ -271,28 +475,36 @@ async def check_news():
         if subscribed_stocks:
             logger.info(f"定时检查 {len(subscribed_stocks)} 只股票的新闻")
             
-            # 这里调用实际的爬取逻辑
-            for stock_code in subscribed_stocks[:5]:  # 限制每次检查5只
-                news_items = await mock_crawl_news(stock_code)
+            # 这里调用实际的爬取逻辑（并发爬取，并发数由 _CRAWL_SEM 限制）
+            results = await asyncio.gather(
+                *(_bounded_crawl(stock_code) for stock_code in subscribed_stocks),
+                return_exceptions=True
+            )
+            
+            for stock_code, news_items in zip(subscribed_stocks, results):
+                if isinstance(news_items, Exception):
+                    logger.error(f"爬取{stock_code}失败: {news_items}")
+                    continue
                 
                 for news in news_items:
-                    await manager.broadcast_to_subscribers(stock_code, {
-                        "type": "news",
-                        "data": news.dict()
-                    })
+                    if not await is_new_news(stock_code, news):
+                        continue
+                    await publish_news(stock_code, news_payload(news))
                     
     except Exception as e:
         logger.error(f"定时检查失败: {e}")
 
 # 如果直接运行此文件
-# if __name__ == "__main__":
-#     import uvicorn
-    
-#     start_monitor()
+if __name__ == "__main__":
+    import importlib.util
+    import uvicorn
     
-#     uvicorn.run(
-#         "news_monitor:app",
-#         host="0.0.0.0",
-#         port=8001,
-#         reload=True
-#     )
\ No newline at end of file
+    # 在仓库根目录以 python -m mods.news_monitor 启动，才能导入 mods 包
+    # 安装了 uvloop（libuv 实现的事件循环）时使用它，WebSocket 推送和爬取的 I/O 调度更快
+    uvicorn.run(
+        "mods.news_monitor:app",
+        host="0.0.0.0",
+        port=8001,
+        reload=True,
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    )
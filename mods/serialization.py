@@ -0,0 +1,44 @@
+# mods/serialization.py
+# app.py、app2.py 与新闻监控共用的序列化工具
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import orjson
+from flask import Response
+from flask.json.provider import JSONProvider
+
+# numpy 数组和标量直接编码，字典键允许非字符串
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# 按秒缓存的当前时间字符串 (秒, ISO字符串)
+_NOW_ISO = (0, '')
+
+
+def now_iso() -> str:
+    """当前时间的ISO字符串，同一秒内复用已格式化的结果"""
+    global _NOW_ISO
+
+    second = int(time.time())
+    cached_second, iso = _NOW_ISO
+    if second != cached_second:
+        iso = datetime.fromtimestamp(second).isoformat()
+        _NOW_ISO = (second, iso)
+    return iso
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask 的 JSON 提供者：用 orjson 序列化（更快，numpy 标量直接编码，中文直接输出 UTF-8）"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def json_response(payload: Any, status: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """用 orjson 序列化的 JSON 响应，所有接口统一使用"""
+    return Response(orjson.dumps(payload, option=ORJSON_OPTIONS),
+                    status=status, headers=headers, mimetype='application/json')
@@ -3,84 +3,269 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from Ashare.Ashare import get_price, get_price_min_tx
+from mods.indicators import signal_indicators, latest_indicators, ema_state, risk_stats
 import warnings
 import re
-from typing import Dict, List, Optional, Any
+import os
+import time
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Any, Tuple
 
 warnings.filterwarnings('ignore')
 
+# calculate_indicators 写入 DataFrame 的指标列
+INDICATOR_COLUMNS = ['MA5', 'MA10', 'MA20', 'MA30', 'MA60', 'MACD', 'MACD_signal', 'RSI',
+                     'BB_middle', 'BB_upper', 'BB_lower', 'BB_position', '%K', '%D',
+                     'volume_ma5', 'volume_ratio']
+
+# 信心分数分档：SIGNAL_THRESHOLDS 为各档下限（升序），SIGNAL_LEVELS 为对应的 (信号, 操作, 仓位建议)，
+# 低于最低档时取第一项
+SIGNAL_THRESHOLDS = (45, 60, 75)
+SIGNAL_LEVELS = (
+    ("回避", "SELL", "不建议"),
+    ("关注", "HOLD", "观望"),
+    ("买入", "BUY", "轻仓位(20-30%)"),
+    ("强烈买入", "BUY", "中等仓位(30-50%)"),
+)
+
+# 每类信号计入信心分数的上限；动量、摆动指标两类各自能拿到的最高分（用于估计信心分数上限）
+CATEGORY_SCORE_CAP = 30
+MOMENTUM_MAX_SCORE = 20 + 15  # RSI超卖 + MACD金叉
+OSCILLATOR_MAX_SCORE = 15 + 10  # K值超卖 + 接近布林带下轨
+
+# 日线数据缓存有效期（秒）：同一批次内重复获取同一只股票时直接复用，当日K线最多滞后这么久
+DAILY_CACHE_TTL = 300
+
+# 交易时段（HHMM）：收盘时间留出余量，等数据源的当日K线定稿；休市期间日线不再变化
+MARKET_OPEN = 915
+MARKET_CLOSE = 1530
+
+# 休市期间的日线磁盘缓存目录：多个 worker 进程、服务重启之间共享（需要 pyarrow，不可用时只用内存缓存）
+DAILY_DISK_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'daily')
+
+def _last_close() -> Optional[float]:
+    """休市时返回最近一次收盘的时间戳；交易时段内返回 None（节假日按交易日处理）"""
+    now = datetime.now()
+    hhmm = now.hour * 100 + now.minute
+    if now.weekday() < 5 and hhmm >= MARKET_CLOSE:
+        day = now.date()
+    elif now.weekday() < 5 and hhmm >= MARKET_OPEN:
+        return None
+    else:
+        day = now.date() - timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+    close = datetime.combine(day, datetime.min.time()).replace(hour=MARKET_CLOSE // 100, minute=MARKET_CLOSE % 100)
+    return close.timestamp()
+
+@lru_cache(maxsize=8192)  # 容纳全市场股票，避免全量扫描时互相挤出
+def _fetch_daily(stock_code: str, period_days: int, time_key: int) -> pd.DataFrame:
+    """获取日线数据，按 (股票代码, 天数, 时间段) 缓存；获取失败抛出异常，不会被缓存"""
+    return get_price(stock_code, frequency='1d', count=period_days)
+
+@lru_cache(maxsize=8192)
+def _fetch_daily_closed(stock_code: str, period_days: int, last_close: float) -> pd.DataFrame:
+    """
+    休市期间获取日线数据，内存中缓存到下次开盘
+
+    收盘后写入过的磁盘文件直接读取，否则下载后写入磁盘（先写临时文件再替换，多进程同时写入也不会读到半个文件）
+    """
+    path = os.path.join(DAILY_DISK_CACHE_DIR, f"{stock_code}_{period_days}.feather")
+    try:
+        if os.path.getmtime(path) >= last_close:
+            return pd.read_feather(path).set_index('day').rename_axis('')
+    except Exception:
+        pass
+    
+    df = get_price(stock_code, frequency='1d', count=period_days)
+    try:
+        os.makedirs(DAILY_DISK_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.rename_axis('day').reset_index().to_feather(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+    return df
+
+def fetch_daily(stock_code: str, period_days: int = 120) -> pd.DataFrame:
+    """
+    获取日线数据（交易时段内 DAILY_CACHE_TTL 内复用缓存，休市期间复用到下次开盘）
+
+    返回的 DataFrame 是缓存共享的对象，调用方不要原地修改
+    """
+    last_close = _last_close()
+    if last_close is None:
+        return _fetch_daily(stock_code, period_days, int(time.time() // DAILY_CACHE_TTL))
+    return _fetch_daily_closed(stock_code, period_days, last_close)
+
+# 实时K线缓存：看板轮询时同一股票的分钟数据在有效期内直接复用，不再重复请求接口
+REALTIME_CACHE_TTL = 30
+REALTIME_CACHE_SIZE = 2048
+_REALTIME_CACHE: Dict[Tuple[str, int], Tuple[float, Dict[str, Any]]] = {}
+_REALTIME_LOCK = threading.Lock()
+
+def _realtime_cache_get(key: Tuple[str, int]) -> Optional[Dict[str, Any]]:
+    """读取未过期的实时数据缓存"""
+    entry = _REALTIME_CACHE.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
+
+def _realtime_cache_put(key: Tuple[str, int], data: Dict[str, Any]) -> None:
+    """写入实时数据缓存；满了先清理过期项，仍然满则淘汰最早写入的"""
+    now = time.monotonic()
+    with _REALTIME_LOCK:
+        if len(_REALTIME_CACHE) >= REALTIME_CACHE_SIZE:
+            for k in [k for k, (expires, _) in _REALTIME_CACHE.items() if expires < now]:
+                del _REALTIME_CACHE[k]
+            if len(_REALTIME_CACHE) >= REALTIME_CACHE_SIZE:
+                del _REALTIME_CACHE[next(iter(_REALTIME_CACHE))]
+        _REALTIME_CACHE.pop(key, None)
+        _REALTIME_CACHE[key] = (now + REALTIME_CACHE_TTL, data)
+
 class StockAnalyzer:
     """
     股票分析核心类
     包含所有分析逻辑，可以在任何地方调用
     """
     
-    def __init__(self, stock_code: str, period_days: int = 120):
+    def __init__(self, stock_code: str, period_days: int = 120,
+                 df: Optional[pd.DataFrame] = None):
         """
         初始化分析器
         
         Args:
             stock_code: 股票代码 (如 'sh600519')
             period_days: 分析的历史数据天数
+            df: 预先获取的日线数据（为空时自行获取）
         """
         self.stock_code = stock_code
         self.period_days = period_days
         self.df = None
         self.df_min = None
-        self._fetch_data()
+        self._indicators_ready = False
+        self._arrays = None  # 计算指标后缓存的 {列名: ndarray}
+        self._rows = None    # 计算指标后缓存的 (最新一行, 前一行)
+        self._ema_states = None  # 实时更新用的 (倒数第二天, 最后一天) EMA 递推状态
+        
+        if df is None:
+            self._fetch_data()
+        else:
+            self._set_data(df)
     
     def _fetch_data(self) -> None:
         """获取基础数据"""
         try:
-            self.df = get_price(self.stock_code, frequency='1d', count=self.period_days)
-            if not self.df.empty:
-                self.df['returns'] = self.df['close'].pct_change()
+            self._set_data(fetch_daily(self.stock_code, self.period_days))
         except Exception as e:
             print(f"获取数据失败 {self.stock_code}: {e}")
             self.df = pd.DataFrame()
     
+    def _set_data(self, df: pd.DataFrame) -> None:
+        """设置日线数据并计算收益率（assign 生成新对象，不会修改传入的 df）"""
+        if not df.empty:
+            # 收盘价是连续的数值列，直接用 numpy 计算，省去 pct_change 的缺失值处理
+            c = df['close'].to_numpy(dtype=np.float64)
+            r = np.empty_like(c)
+            r[0] = np.nan
+            r[1:] = c[1:] / c[:-1] - 1
+            df = df.assign(returns=r)
+        self.df = df
+        self._indicators_ready = False
+        self._arrays = None
+        self._rows = None
+        self._ema_states = None
+    
     def calculate_indicators(self) -> bool:
         """计算技术指标"""
         if self.df.empty or len(self.df) < 30:
             return False
         
-        df = self.df.copy()
-        
-        # 移动平均线
-        for window in [5, 10, 20, 30, 60]:
-            df[f'MA{window}'] = df['close'].rolling(window=window).mean()
-        
-        # MACD
-        exp1 = df['close'].ewm(span=12, adjust=False).mean()
-        exp2 = df['close'].ewm(span=26, adjust=False).mean()
-        df['MACD'] = exp1 - exp2
-        df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        
-        # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # 布林带
-        df['BB_middle'] = df['close'].rolling(20).mean()
-        bb_std = df['close'].rolling(20).std()
-        df['BB_upper'] = df['BB_middle'] + (bb_std * 2)
-        df['BB_lower'] = df['BB_middle'] - (bb_std * 2)
-        df['BB_position'] = (df['close'] - df['BB_lower']) / (df['BB_upper'] - df['BB_lower'])
-        
-        # KD指标
-        low_14 = df['low'].rolling(14).min()
-        high_14 = df['high'].rolling(14).max()
-        df['%K'] = 100 * ((df['close'] - low_14) / (high_14 - low_14))
-        df['%D'] = df['%K'].rolling(3).mean()
-        
-        # 成交量
-        df['volume_ma5'] = df['volume'].rolling(5).mean()
-        df['volume_ratio'] = df['volume'] / df['volume_ma5']
+        # self.df 由 _set_data 生成，为本对象独有，指标列直接写入，不再整表复制
+        df = self.df
+        
+        # 全部指标在 numpy 数组上一次算完（安装 numba 时为单次遍历的融合内核），再写回 DataFrame
+        cols = signal_indicators(df['close'].to_numpy(dtype=np.float64),
+                                 df['high'].to_numpy(dtype=np.float64),
+                                 df['low'].to_numpy(dtype=np.float64),
+                                 df['volume'].to_numpy(dtype=np.float64))
+        for name in INDICATOR_COLUMNS:
+            df[name] = cols[name]
+        
+        self._indicators_ready = True
+        
+        # 缓存各列数组，后续分析直接使用，不再从 DataFrame 重复取列；最后两行在首次分析时缓存
+        self._arrays = {col: df[col].to_numpy() for col in df.columns}
+        self._rows = None
+        self._ema_states = None
+        return True
+    
+    def update_bar(self, bar: Dict[str, float], timestamp: Optional[Any] = None,
+                   replace_last: bool = False) -> bool:
+        """
+        实时追加一根日K线（或更新当天尚未收盘的最后一根），只计算这一行的指标
+        
+        指标已计算时不重算整段历史：窗口指标只看最后一个窗口，EMA 从前一天的状态递推一步；
+        数据超过 period_days 时丢弃最早的行。实时场景下每来一根新K线调用一次，再调用 analyze()
+        
+        Args:
+            bar: {'open', 'close', 'high', 'low', 'volume'}
+            timestamp: 追加的K线时间（默认今天）
+            replace_last: 为 True 时替换最后一根K线
+        
+        Returns:
+            是否更新成功（没有数据时返回 False）
+        """
+        if self.df is None or self.df.empty:
+            return False
+        
+        df = self.df
+        if replace_last:
+            label = df.index[-1]
+            base = df.iloc[:-1]
+        else:
+            label = pd.Timestamp(timestamp) if timestamp is not None else pd.Timestamp.now().normalize()
+            base = df
+        
+        ohlcv = {col: float(bar[col]) for col in ['open', 'close', 'high', 'low', 'volume']}
+        
+        # 指标尚未计算时只追加数据；历史太短无法增量计算时按完整流程重算
+        if not self._indicators_ready or len(base) < 30:
+            was_ready = self._indicators_ready
+            new_row = pd.DataFrame([ohlcv], index=[label])
+            self._set_data(pd.concat([base[['open', 'close', 'high', 'low', 'volume']], new_row])
+                           .iloc[-self.period_days:])
+            if was_ready:
+                self.calculate_indicators()
+            return True
+        
+        if self._ema_states is None:
+            close = df['close'].to_numpy(dtype=np.float64)
+            self._ema_states = (ema_state(close[:-1]), ema_state(close))
+        before_last, last = self._ema_states
+        prev_ema = before_last if replace_last else last
+        
+        tail = base.iloc[-59:]
+        arrays = [np.append(tail[col].to_numpy(dtype=np.float64), ohlcv[col])
+                  for col in ['close', 'high', 'low', 'volume']]
+        prev_k = tuple(tail['%K'].to_numpy(dtype=np.float64)[-2:].tolist())
+        row, new_state = latest_indicators(*arrays, prev_k=prev_k, prev_ema=prev_ema)
+        self._ema_states = (prev_ema, new_state)
+        
+        values = dict(ohlcv, returns=ohlcv['close'] / float(base['close'].iloc[-1]) - 1)
+        values.update((name, row[name]) for name in INDICATOR_COLUMNS)
+        new_row = pd.DataFrame([values], index=[label]).reindex(columns=df.columns)
+        
+        df = pd.concat([base, new_row])
+        if len(df) > self.period_days:
+            df = df.iloc[-self.period_days:]
         
         self.df = df
+        self._arrays = {col: df[col].to_numpy() for col in df.columns}
+        self._rows = None
         return True
     
     def analyze(self) -> Dict[str, Any]:
@@ -88,8 +273,7 @@ class StockAnalyzer:
         if self.df.empty or len(self.df) < 30:
             return self._empty_result()
         
-        latest = self.df.iloc[-1]
-        prev = self.df.iloc[-2]
+        latest, prev = self._last_two_rows()
         
         # 分析信号
         signals = self._analyze_signals(latest, prev)
@@ -99,7 +283,21 @@ class StockAnalyzer:
         result = self._generate_result(latest, prev, signals, confidence)
         return result
     
-    def _analyze_signals(self, latest: pd.Series, prev: pd.Series) -> Dict[str, Any]:
+    def _last_two_rows(self) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        最后两行（最新、前一日）转成 {列名: float} 字典
+
+        一次转换为 Python 标量，后续按列名取值是普通字典查找，不再每次经过 pd.Series 索引和装箱；
+        结果缓存到数据或指标变化为止
+        """
+        if self._rows is None:
+            tail = self.df.iloc[-2:]
+            values = tail.to_numpy(dtype=np.float64).tolist()
+            columns = tail.columns.tolist()
+            self._rows = (dict(zip(columns, values[1])), dict(zip(columns, values[0])))
+        return self._rows
+    
+    def _analyze_signals(self, latest: Dict[str, float], prev: Dict[str, float]) -> Dict[str, Any]:
         """分析技术信号"""
         signals = {
             'trend': {'reasons': [], 'score': 0},
@@ -109,23 +307,33 @@ class StockAnalyzer:
             'patterns': {'patterns': [], 'score': 0}
         }
         
-        # 趋势分析
+        self._score_trend(latest, signals['trend'])
+        self._score_momentum(latest, prev, signals['momentum'])
+        self._score_oscillators(latest, signals['oscillators'])
+        self._score_volume(latest, prev, signals['volume'])
+        
+        return signals
+    
+    def _score_trend(self, latest: Dict[str, float], signal: Dict[str, Any]) -> None:
+        """趋势分析"""
         if latest['close'] > latest.get('MA20', 0):
-            signals['trend']['reasons'].append("价格站上20日线")
-            signals['trend']['score'] += 15
+            signal['reasons'].append("价格站上20日线")
+            signal['score'] += 15
         
         if latest.get('MA5', 0) > latest.get('MA10', 0) > latest.get('MA20', 0):
-            signals['trend']['reasons'].append("均线多头排列")
-            signals['trend']['score'] += 10
-        
-        # 动量分析
+            signal['reasons'].append("均线多头排列")
+            signal['score'] += 10
+    
+    def _score_momentum(self, latest: Dict[str, float], prev: Dict[str, float],
+                        signal: Dict[str, Any]) -> None:
+        """动量分析"""
         rsi = latest.get('RSI', 50)
         if 30 < rsi < 70:
-            signals['momentum']['reasons'].append("RSI处于健康区间")
-            signals['momentum']['score'] += 10
+            signal['reasons'].append("RSI处于健康区间")
+            signal['score'] += 10
         elif rsi < 30:
-            signals['momentum']['reasons'].append("RSI超卖")
-            signals['momentum']['score'] += 20
+            signal['reasons'].append("RSI超卖")
+            signal['score'] += 20
         
         macd = latest.get('MACD', 0)
         macd_signal = latest.get('MACD_signal', 0)
@@ -133,31 +341,58 @@ class StockAnalyzer:
         prev_signal = prev.get('MACD_signal', 0)
         
         if macd > macd_signal and prev_macd <= prev_signal:
-            signals['momentum']['reasons'].append("MACD金叉")
-            signals['momentum']['score'] += 15
-        
-        # 摆动指标
+            signal['reasons'].append("MACD金叉")
+            signal['score'] += 15
+    
+    def _score_oscillators(self, latest: Dict[str, float], signal: Dict[str, Any]) -> None:
+        """摆动指标"""
         k_value = latest.get('%K', 50)
         if k_value < 20:
-            signals['oscillators']['reasons'].append("K值超卖")
-            signals['oscillators']['score'] += 15
+            signal['reasons'].append("K值超卖")
+            signal['score'] += 15
         
         bb_position = latest.get('BB_position', 0.5)
         if bb_position < 0.3:
-            signals['oscillators']['reasons'].append("接近布林带下轨")
-            signals['oscillators']['score'] += 10
-        
-        # 成交量
+            signal['reasons'].append("接近布林带下轨")
+            signal['score'] += 10
+    
+    def _score_volume(self, latest: Dict[str, float], prev: Dict[str, float],
+                      signal: Dict[str, Any]) -> None:
+        """成交量"""
         volume_ratio = latest.get('volume_ratio', 1)
         if volume_ratio > 1.5:
-            signals['volume']['reasons'].append("成交量放大")
-            signals['volume']['score'] += 15
+            signal['reasons'].append("成交量放大")
+            signal['score'] += 15
         
         if latest['close'] > prev['close'] and latest['volume'] > prev['volume']:
-            signals['volume']['reasons'].append("量价齐升")
-            signals['volume']['score'] += 10
+            signal['reasons'].append("量价齐升")
+            signal['score'] += 10
+    
+    def confidence_upper_bound(self) -> float:
+        """
+        不做完整分析，估计信心分数的上限
         
-        return signals
+        趋势、成交量两类信号直接用已计算的指标打分；动量、摆动指标两类按各自能拿到的最高分计入。
+        批量筛选时上限低于门槛的股票不必再做完整分析（指标未计算时先计算）
+        
+        Returns:
+            信心分数上限（数据不足时返回 0）
+        """
+        if not self._indicators_ready and not self.calculate_indicators():
+            return 0
+        
+        arrays = self._arrays
+        latest = {col: float(arrays[col][-1]) for col in ('close', 'volume', 'MA5', 'MA10', 'MA20', 'volume_ratio')}
+        prev = {col: float(arrays[col][-2]) for col in ('close', 'volume')}
+        
+        trend = {'reasons': [], 'score': 0}
+        volume_signal = {'reasons': [], 'score': 0}
+        self._score_trend(latest, trend)
+        self._score_volume(latest, prev, volume_signal)
+        
+        bound = (min(trend['score'], CATEGORY_SCORE_CAP) + min(volume_signal['score'], CATEGORY_SCORE_CAP)
+                 + min(MOMENTUM_MAX_SCORE, CATEGORY_SCORE_CAP) + min(OSCILLATOR_MAX_SCORE, CATEGORY_SCORE_CAP))
+        return min(bound, 100)
     
     def _calculate_confidence(self, signals: Dict[str, Any]) -> float:
         """计算信心分数"""
@@ -166,11 +401,11 @@ class StockAnalyzer:
         
         for category in signals.values():
             if 'score' in category:
-                total_score += min(category['score'], 30)
+                total_score += min(category['score'], CATEGORY_SCORE_CAP)
         
         return min(total_score, 100)
     
-    def _generate_result(self, latest: pd.Series, prev: pd.Series, 
+    def _generate_result(self, latest: Dict[str, float], prev: Dict[str, float],
                         signals: Dict[str, Any], confidence: float) -> Dict[str, Any]:
         """生成分析结果"""
         price_change = ((latest['close'] - prev['close']) / prev['close'] * 100)
@@ -181,23 +416,8 @@ class StockAnalyzer:
             if 'reasons' in category:
                 key_reasons.extend(category['reasons'])
         
-        # 确定信号和操作
-        if confidence >= 75:
-            signal = "强烈买入"
-            action = "BUY"
-            position = "中等仓位(30-50%)"
-        elif confidence >= 60:
-            signal = "买入"
-            action = "BUY"
-            position = "轻仓位(20-30%)"
-        elif confidence >= 45:
-            signal = "关注"
-            action = "HOLD"
-            position = "观望"
-        else:
-            signal = "回避"
-            action = "SELL"
-            position = "不建议"
+        # 确定信号和操作（按分数所在的档位查表）
+        signal, action, position = SIGNAL_LEVELS[bisect_right(SIGNAL_THRESHOLDS, confidence)]
         
         # 计算风险指标
         risk_metrics = self._calculate_risk_metrics()
@@ -235,19 +455,17 @@ class StockAnalyzer:
         if len(self.df) < 20:
             return {}
         
-        returns = self.df['returns'].dropna()
+        returns = self._arrays['returns'] if self._arrays is not None else self.df['returns'].to_numpy()
+        returns_std, returns_mean, max_drawdown = risk_stats(returns)
         
         # 波动率
-        volatility = returns.std() * np.sqrt(252) * 100
+        volatility = returns_std * np.sqrt(252) * 100
         
         # 夏普比率
-        sharpe = returns.mean() / returns.std() * np.sqrt(252) if returns.std() > 0 else 0
+        sharpe = returns_mean / returns_std * np.sqrt(252) if returns_std > 0 else 0
         
         # 最大回撤
-        cumulative = (1 + returns).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        max_dd = drawdown.min() * 100
+        max_dd = max_drawdown * 100
         
         risk_level = '高' if volatility > 40 else '中' if volatility > 20 else '低'
         
@@ -290,20 +508,27 @@ class StockAnalyzer:
             
             data_delay = (datetime.now() - df_min.index[-1].replace(tzinfo=None)).total_seconds()
             
-            # 转换为列表格式
-            kline_data = []
-            for idx, row in df_min.iterrows():
-                kline_data.append({
-                    'timestamp': idx.strftime('%Y-%m-%d %H:%M:%S'),
-                    'time_str': idx.strftime('%H:%M'),
-                    'open': round(row['open'], 2),
-                    'close': round(row['close'], 2),
-                    'high': round(row['high'], 2),
-                    'low': round(row['low'], 2),
-                    'volume': int(row['volume']),
-                    'change': round(row['close'] - row['open'], 2),
-                    'change_percent': round((row['close'] - row['open']) / row['open'] * 100, 2) if row['open'] > 0 else 0
-                })
+            # 转换为列表格式（整列计算后一次性转成字典列表）
+            open_ = df_min['open'].to_numpy(dtype=np.float64)
+            close = df_min['close'].to_numpy(dtype=np.float64)
+            change = close - open_
+            with np.errstate(divide='ignore', invalid='ignore'):
+                change_percent = np.where(open_ > 0, change / open_ * 100, 0.0)
+            
+            # 价格列统一保留两位小数：整表一次 round（字符串列不受影响）
+            bars = pd.DataFrame({
+                'timestamp': df_min.index.strftime('%Y-%m-%d %H:%M:%S'),
+                'time_str': df_min.index.strftime('%H:%M'),
+                'open': open_,
+                'close': close,
+                'high': df_min['high'].to_numpy(dtype=np.float64),
+                'low': df_min['low'].to_numpy(dtype=np.float64),
+                'volume': df_min['volume'].to_numpy().astype(np.int64),
+                'change': change,
+                'change_percent': change_percent
+            }).round(2)
+            kline_data = bars.to_dict('records')
+            bars_arr = bars[['open', 'close', 'high', 'low', 'volume']].to_numpy(dtype=np.float64)
             
             return {
                 'frequency': frequency,
@@ -311,19 +536,29 @@ class StockAnalyzer:
                 'data_delay_seconds': round(data_delay, 1),
                 'latest_time': kline_data[-1]['timestamp'] if kline_data else None,
                 'kline_data': kline_data,
-                'summary': self._calculate_realtime_summary(kline_data)
+                'summary': self._calculate_realtime_summary(kline_data, bars_arr)
             }
             
         except Exception as e:
             return {'error': str(e)}
     
-    def _calculate_realtime_summary(self, kline_data: List[Dict]) -> Dict[str, Any]:
-        """计算实时数据摘要"""
+    def _calculate_realtime_summary(self, kline_data: List[Dict],
+                                    bars_arr: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        计算实时数据摘要
+        
+        Args:
+            kline_data: K线字典列表
+            bars_arr: 同一批K线的 (K线数, 5) 矩阵，列为 open/close/high/low/volume（为空时由 kline_data 生成）
+        """
         if not kline_data:
             return {}
         
-        closes = [bar['close'] for bar in kline_data]
-        volumes = [bar['volume'] for bar in kline_data]
+        if bars_arr is None:
+            bars_arr = np.array([[bar['open'], bar['close'], bar['high'], bar['low'], bar['volume']]
+                                 for bar in kline_data], dtype=np.float64)
+        closes = bars_arr[:, 1]
+        volumes = bars_arr[:, 4]
         latest = kline_data[-1]
         
         summary = {
@@ -331,42 +566,51 @@ class StockAnalyzer:
             'latest_change': latest['change'],
             'latest_change_percent': latest['change_percent'],
             'latest_volume': latest['volume'],
-            'high': max(closes) if closes else 0,
-            'low': min(closes) if closes else 0,
-            'avg_price': round(sum(closes) / len(closes), 2) if closes else 0,
-            'total_volume': sum(volumes),
-            'avg_volume': round(sum(volumes) / len(volumes), 2) if volumes else 0
+            'high': float(closes.max()),
+            'low': float(closes.min()),
+            'avg_price': round(float(closes.mean()), 2),
+            'total_volume': int(volumes.sum()),
+            'avg_volume': round(float(volumes.mean()), 2)
         }
         
         # 判断短期趋势
         if len(closes) >= 3:
-            if closes[-1] > closes[-2] > closes[-3]:
+            steps = np.diff(closes[-3:])
+            if (steps > 0).all():
                 summary['short_trend'] = '上涨'
-            elif closes[-1] < closes[-2] < closes[-3]:
+            elif (steps < 0).all():
                 summary['short_trend'] = '下跌'
             else:
                 summary['short_trend'] = '震荡'
         
         return summary
     
-    def analyze_realtime(self, minutes: int = 30) -> Dict[str, Any]:
+    def analyze_realtime(self, minutes: int = 30,
+                         day_analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         实时分析
         
         Args:
             minutes: 分析多少分钟的实时数据
+            day_analysis: 已有的日线分析结果（为空时重新分析）
         
         Returns:
             实时分析结果
         """
-        # 获取实时数据
-        realtime_data = self.get_realtime_data(minutes=minutes, frequency='5min')
-        
-        if 'error' in realtime_data:
-            return {'error': realtime_data['error']}
+        # 获取实时数据（REALTIME_CACHE_TTL 内复用，返回的是共享对象，不要原地修改）
+        cache_key = (self.stock_code, minutes)
+        realtime_data = _realtime_cache_get(cache_key)
+        if realtime_data is None:
+            realtime_data = self.get_realtime_data(minutes=minutes, frequency='5min')
+            
+            if 'error' in realtime_data:
+                return {'error': realtime_data['error']}
+            _realtime_cache_put(cache_key, realtime_data)
         
-        # 获取日线分析
-        day_analysis = self.analyze()
+        # 获取日线分析：最新价先并入当天K线（只增量更新最后一行指标）
+        if day_analysis is None:
+            self.apply_realtime_price(realtime_data)
+            day_analysis = self.analyze()
         
         # 结合实时和日线分析
         combined_analysis = {
@@ -379,6 +623,59 @@ class StockAnalyzer:
         
         return combined_analysis
     
+    def apply_realtime_price(self, realtime_data: Dict[str, Any]) -> bool:
+        """
+        把实时行情的最新价并入当天的日K线
+        
+        日线数据已包含当天的K线时，用最新价更新收盘价和最高/最低价，再通过 update_bar 只重算最后一行指标；
+        成交量保留日线数据源的数值（分钟线成交量的单位与日线不一定相同）
+        
+        Returns:
+            是否更新了日K线
+        """
+        kline_data = realtime_data.get('kline_data')
+        if not kline_data or self.df.empty or len(self.df) < 30:
+            return False
+        
+        last_day = self.df.index[-1]
+        if kline_data[-1]['timestamp'][:10] != last_day.strftime('%Y-%m-%d'):
+            return False
+        
+        price = float(kline_data[-1]['close'])
+        row = self.df.iloc[-1]
+        if price == row['close']:
+            return False
+        
+        if not self._indicators_ready:
+            self.calculate_indicators()
+        return self.update_bar({
+            'open': row['open'],
+            'close': price,
+            'high': max(row['high'], price),
+            'low': min(row['low'], price),
+            'volume': row['volume']
+        }, replace_last=True)
+    
+    def analyze_both(self, rt_minutes: int = 30) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        日线分析与实时分析一起完成
+        
+        指标最多计算一次，日线分析结果直接复用给实时分析
+        
+        Args:
+            rt_minutes: 实时分析的分钟数
+        
+        Returns:
+            (日线分析结果, 实时分析结果)
+        """
+        if not self._indicators_ready:
+            self.calculate_indicators()
+        
+        day_result = self.analyze()
+        realtime_result = self.analyze_realtime(minutes=rt_minutes, day_analysis=day_result)
+        
+        return day_result, realtime_result
+    
     def _generate_realtime_signals(self, realtime_data: Dict, day_analysis: Dict) -> Dict[str, Any]:
         """生成实时交易信号"""
         signals = {
@@ -422,16 +719,22 @@ class StockAnalyzer:
 class BatchStockAnalyzer:
     """批量股票分析器"""
     
-    def __init__(self, stock_list: List[str], period_days: int = 120):
+    def __init__(self, stock_list: List[str], period_days: int = 120,
+                 frames: Optional[Dict[str, pd.DataFrame]] = None,
+                 max_workers: int = 16):
         """
         初始化批量分析器
         
         Args:
             stock_list: 股票代码列表
             period_days: 分析周期
+            frames: 预先获取的日线数据 {股票代码: DataFrame}，缺失的股票自行获取
+            max_workers: 获取数据（缺失的日线、实时分析）时的最大并发请求数
         """
         self.stock_list = stock_list
         self.period_days = period_days
+        self.frames = dict(frames) if frames else {}
+        self.max_workers = max_workers
         self.results = []
     
     def analyze_all(self, min_confidence: float = 80.0) -> List[Dict[str, Any]]:
@@ -448,13 +751,18 @@ class BatchStockAnalyzer:
         
         high_confidence_results = []
         
+        # 缺失的日线数据先多线程并发获取，重叠网络等待，后面的循环只做计算
+        missing = [code for code in self.stock_list if code not in self.frames]
+        if missing:
+            self.frames.update(fetch_daily_frames(missing, self.period_days, self.max_workers))
+        
         for i, stock_code in enumerate(self.stock_list, 1):
             # 显示进度
             if i % 10 == 0:
                 print(f"  进度: {i}/{len(self.stock_list)}")
             
             try:
-                analyzer = StockAnalyzer(stock_code, self.period_days)
+                analyzer = StockAnalyzer(stock_code, self.period_days, df=self.frames.get(stock_code))
                 
                 if analyzer.df.empty or len(analyzer.df) < 30:
                     continue
@@ -462,6 +770,10 @@ class BatchStockAnalyzer:
                 if not analyzer.calculate_indicators():
                     continue
                 
+                # 信心分数上限都达不到门槛的股票直接跳过，不做完整分析
+                if analyzer.confidence_upper_bound() < min_confidence:
+                    continue
+                
                 result = analyzer.analyze()
                 
                 if result.get('success') and result['analysis']['confidence_score'] >= min_confidence:
@@ -508,39 +820,42 @@ class BatchStockAnalyzer:
         """
         if stock_codes is None:
             stock_codes = self.stock_list
+        stock_codes = stock_codes[:50]  # 限制数量
         
-        combined_results = []
-        
-        for stock_code in stock_codes[:50]:  # 限制数量
+        def _analyze_one(stock_code: str) -> Optional[Dict[str, Any]]:
             try:
-                analyzer = StockAnalyzer(stock_code, self.period_days)
+                analyzer = StockAnalyzer(stock_code, self.period_days, df=self.frames.get(stock_code))
                 
                 # 实时分析
                 realtime_result = analyzer.analyze_realtime(minutes=realtime_minutes)
                 
                 # 日线分析
                 if analyzer.df.empty or len(analyzer.df) < 30:
-                    continue
+                    return None
                 
                 if not analyzer.calculate_indicators():
-                    continue
+                    return None
                 
                 day_result = analyzer.analyze()
                 
                 if day_result.get('success'):
-                    combined_result = {
+                    return {
                         'stock_code': stock_code,
                         'realtime_analysis': realtime_result,
                         'day_analysis': day_result,
                         'combined_confidence': self._calculate_combined_confidence(realtime_result, day_result)
                     }
-                    combined_results.append(combined_result)
                     
             except Exception as e:
                 print(f"实时分析 {stock_code} 失败: {e}")
-                continue
+            return None
         
-        return combined_results
+        if not stock_codes:
+            return []
+        
+        # 每只股票要请求日线和分钟线两个接口，多线程并发，结果保持原有顺序
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stock_codes))) as executor:
+            return [r for r in executor.map(_analyze_one, stock_codes) if r is not None]
     
     def _calculate_combined_confidence(self, realtime_result: Dict, day_result: Dict) -> float:
         """计算综合信心分数"""
@@ -580,28 +895,23 @@ def get_2min_data(stock_code: str, total_minutes: int = 60) -> Dict[str, Any]:
         if df_1min.empty:
             return {'error': '无法获取1分钟数据', 'data': []}
         
-        # 聚合成2分钟数据
-        two_min_data = []
+        # 聚合成2分钟数据：相邻两根1分钟K线为一组（第0、1根，第2、3根……），多出的最后一根丢弃
         df_sorted = df_1min.sort_index()
-        
-        for i in range(0, len(df_sorted) - 1, 2):
-            if i + 1 >= len(df_sorted):
-                break
-            
-            bar1 = df_sorted.iloc[i]
-            bar2 = df_sorted.iloc[i + 1]
-            
-            two_min_bar = {
-                'timestamp': bar2.name.strftime('%Y-%m-%d %H:%M:%S'),
-                'time_str': bar2.name.strftime('%H:%M'),
-                'open': round(float(bar1['open']), 2),
-                'close': round(float(bar2['close']), 2),
-                'high': round(max(float(bar1['high']), float(bar2['high'])), 2),
-                'low': round(min(float(bar1['low']), float(bar2['low'])), 2),
-                'volume': int(bar1['volume'] + bar2['volume'])
-            }
-            
-            two_min_data.append(two_min_bar)
+        n = len(df_sorted) // 2 * 2
+        bar1 = df_sorted.iloc[0:n:2]
+        bar2 = df_sorted.iloc[1:n:2]
+        
+        two_min_data = pd.DataFrame({
+            'timestamp': bar2.index.strftime('%Y-%m-%d %H:%M:%S'),
+            'time_str': bar2.index.strftime('%H:%M'),
+            'open': bar1['open'].to_numpy(dtype=np.float64),
+            'close': bar2['close'].to_numpy(dtype=np.float64),
+            'high': np.maximum(bar1['high'].to_numpy(dtype=np.float64),
+                               bar2['high'].to_numpy(dtype=np.float64)),
+            'low': np.minimum(bar1['low'].to_numpy(dtype=np.float64),
+                              bar2['low'].to_numpy(dtype=np.float64)),
+            'volume': (bar1['volume'].to_numpy() + bar2['volume'].to_numpy()).astype(np.int64)
+        }).round(2).to_dict('records')
         
         # 只保留最新的数据
         recent_data = two_min_data[-min(len(two_min_data), total_minutes // 2):]
@@ -638,16 +948,46 @@ def analyze_stock_simple(stock_code: str, period_days: int = 120) -> Dict[str, A
     
     return analyzer.analyze()
 
-def batch_analyze_stocks(stock_list: List[str], min_confidence: float = 80.0) -> List[Dict[str, Any]]:
+def batch_analyze_stocks(stock_list: List[str], min_confidence: float = 80.0,
+                         frames: Optional[Dict[str, pd.DataFrame]] = None) -> List[Dict[str, Any]]:
     """
     批量分析股票（单函数版本）
     
     Args:
         stock_list: 股票代码列表
         min_confidence: 最小信心分数
+        frames: 预先获取的日线数据 {股票代码: DataFrame}
     
     Returns:
         分析结果列表
     """
-    batch_analyzer = BatchStockAnalyzer(stock_list)
-    return batch_analyzer.analyze_all(min_confidence)
\ No newline at end of file
+    batch_analyzer = BatchStockAnalyzer(stock_list, frames=frames)
+    return batch_analyzer.analyze_all(min_confidence)
+
+def fetch_daily_frames(stock_list: List[str], period_days: int = 120,
+                       max_workers: int = 32) -> Dict[str, pd.DataFrame]:
+    """
+    并发获取多只股票的日线数据
+    
+    行情接口是网络等待为主，多线程并发请求，总耗时接近最慢的一次请求而不是所有请求之和
+    
+    Args:
+        stock_list: 股票代码列表
+        period_days: 日线数量
+        max_workers: 最大并发请求数
+    
+    Returns:
+        {股票代码: DataFrame}，获取失败的股票为空 DataFrame
+    """
+    def _fetch(stock_code: str) -> pd.DataFrame:
+        try:
+            return fetch_daily(stock_code, period_days)
+        except Exception as e:
+            print(f"获取数据失败 {stock_code}: {e}")
+            return pd.DataFrame()
+    
+    if not stock_list:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(stock_list))) as executor:
+        return dict(zip(stock_list, executor.map(_fetch, stock_list)))
@@ -0,0 +1,48 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import orjson
+
+import app
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+STOCKS = [{'symbol': 'sh600519', 'name': '贵州茅台'}, {'symbol': 'sz000001', 'name': '平安银行'}]
+
+
+class LoadStockUniverseTest(unittest.TestCase):
+    """股票池加载：JSON 首次转换为 feather，之后直接读取 feather 缓存"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        feather = os.path.join(tmp.name, 'universe.feather')
+        self.json_file = os.path.join(tmp.name, 'universe.json')
+        with open(self.json_file, 'wb') as f:
+            f.write(orjson.dumps(STOCKS))
+        for name, value in (('UNIVERSE_FEATHER', feather), ('UNIVERSE_JSON', self.json_file)):
+            patcher = mock.patch.object(app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(app.set_stock_list, app.ALL_STOCKS)
+
+    def test_load_from_json(self):
+        self.assertTrue(app.load_stock_universe())
+        self.assertEqual(app.stock_symbols(10), ['sh600519', 'sz000001'])
+
+    @unittest.skipUnless(HAS_PYARROW, '需要 pyarrow')
+    def test_reload_from_feather_cache(self):
+        self.assertTrue(app.load_stock_universe())
+        self.assertTrue(os.path.exists(app.UNIVERSE_FEATHER))
+        os.remove(self.json_file)  # 第二次只能从 feather 缓存读取
+        app.set_stock_list([])
+        self.assertTrue(app.load_stock_universe())
+        self.assertEqual(app.stock_symbols(10), ['sh600519', 'sz000001'])
+        self.assertEqual(app.ALL_STOCKS['name'].tolist(), ['贵州茅台', '平安银行'])
+
+
+if __name__ == '__main__':
+    unittest.main()
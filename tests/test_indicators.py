@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mods import indicators as ind
+
+
+class RollingFlatWindowTest(unittest.TestCase):
+    """窗口内价格全部相同（停牌）时，滑动均值/标准差应与 pandas 完全一致"""
+
+    def test_constant_series(self):
+        for price in np.round(np.arange(1.0, 100.0, 0.37), 2):
+            close = np.full(60, price)
+            s = pd.Series(close)
+            np.testing.assert_array_equal(ind.rolling_mean(close, 20), s.rolling(20).mean().values)
+            np.testing.assert_array_equal(ind.rolling_std(close, 20), s.rolling(20).std().values)
+
+    def test_flat_tail_after_moves(self):
+        rng = np.random.default_rng(0)
+        close = np.round(np.concatenate([10 + rng.normal(0, 0.5, 40).cumsum(), np.full(25, 12.34)]), 2)
+        s = pd.Series(close)
+        mean = ind.rolling_mean(close, 20)
+        std = ind.rolling_std(close, 20)
+        self.assertEqual(mean[-1], 12.34)
+        self.assertEqual(std[-1], 0.0)
+        np.testing.assert_allclose(mean, s.rolling(20).mean().values, rtol=1e-12)
+        np.testing.assert_allclose(std, s.rolling(20).std().values, rtol=1e-9, atol=1e-12)
+
+
+class SignalIndicatorsFlatTest(unittest.TestCase):
+    """停牌股的信号指标：均线等于停牌价、布林带宽度为 0，与 pandas 一致"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 90
+        self.close = np.round(np.concatenate([10 + rng.normal(0, 0.3, n - 30).cumsum(), np.full(30, 9.87)]), 2)
+        self.high = self.close + 0.05
+        self.low = self.close - 0.05
+        self.volume = np.concatenate([rng.uniform(1e5, 1e6, n - 30), np.full(30, 0.0)])
+
+    def _check(self):
+        cols = ind.signal_indicators(self.close, self.high, self.low, self.volume)
+        s = pd.Series(self.close)
+        for w in (5, 10, 20, 30):
+            self.assertEqual(cols[f'MA{w}'][-1], 9.87)
+            np.testing.assert_allclose(cols[f'MA{w}'], s.rolling(w).mean().values, rtol=1e-12)
+        self.assertEqual(cols['BB_upper'][-1], cols['BB_lower'][-1])
+        self.assertTrue(np.isnan(cols['BB_position'][-1]))
+        self.assertEqual(cols['volume_ma5'][-1], 0.0)
+        self.assertEqual(cols['%D'][-1], cols['%K'][-1])
+
+    def test_vectorized(self):
+        self._check()
+
+    def test_fused_kernel(self):
+        # 未安装 numba 时内核以纯 Python 方式运行，逻辑相同
+        saved = ind.NUMBA_AVAILABLE
+        ind.NUMBA_AVAILABLE = True
+        try:
+            self._check()
+        finally:
+            ind.NUMBA_AVAILABLE = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
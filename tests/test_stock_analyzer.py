@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from mods.stock_analyzer import INDICATOR_COLUMNS, StockAnalyzer
+
+
+def make_frame(close, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.asarray(close, dtype=np.float64)
+    return pd.DataFrame({
+        'open': close,
+        'close': close,
+        'high': close + 0.05,
+        'low': close - 0.05,
+        'volume': rng.uniform(1e5, 1e6, len(close))
+    }, index=pd.date_range('2024-01-02', periods=len(close), freq='B'))
+
+
+def random_close(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.round(10 + rng.normal(0, 0.3, n).cumsum(), 2)
+
+
+class UpdateBarTest(unittest.TestCase):
+    """增量更新最后一根K线的指标应与整段重算一致"""
+
+    def assert_same_as_full(self, analyzer, df):
+        full = StockAnalyzer('test', len(df), df=df)
+        full.calculate_indicators()
+        np.testing.assert_allclose(analyzer.df[INDICATOR_COLUMNS].to_numpy(dtype=np.float64)[-1],
+                                   full.df[INDICATOR_COLUMNS].to_numpy(dtype=np.float64)[-1], rtol=1e-9)
+        self.assertEqual(analyzer.analyze()['analysis'], full.analyze()['analysis'])
+
+    def test_replace_last(self):
+        df = make_frame(random_close())
+        analyzer = StockAnalyzer('test', len(df), df=df)
+        analyzer.calculate_indicators()
+        bar = dict(df.iloc[-1], close=df['close'].iloc[-1] + 0.3, high=df['high'].iloc[-1] + 0.3)
+        self.assertTrue(analyzer.update_bar(bar, replace_last=True))
+        
+        expected = df.copy()
+        expected.iloc[-1] = pd.Series(bar)
+        self.assert_same_as_full(analyzer, expected)
+
+    def test_append(self):
+        df = make_frame(random_close(seed=1))
+        analyzer = StockAnalyzer('test', len(df), df=df.iloc[:-1])
+        analyzer.calculate_indicators()
+        self.assertTrue(analyzer.update_bar(dict(df.iloc[-1]), timestamp=df.index[-1]))
+        self.assert_same_as_full(analyzer, df)
+
+    def test_flat_series(self):
+        # 停牌：收盘价不变，增量结果同样没有舍入误差，不产生虚假信号
+        close = np.concatenate([random_close(90, seed=2), np.full(30, 9.87)])
+        df = make_frame(close)
+        analyzer = StockAnalyzer('test', len(df), df=df.iloc[:-1])
+        analyzer.calculate_indicators()
+        analyzer.update_bar(dict(df.iloc[-1]), timestamp=df.index[-1])
+        
+        latest = analyzer.df.iloc[-1]
+        for w in (5, 10, 20, 30):
+            self.assertEqual(latest[f'MA{w}'], 9.87)
+        self.assertTrue(np.isnan(latest['BB_position']))
+        self.assert_same_as_full(analyzer, df)
+
+
+class AnalyzeRealtimeTest(unittest.TestCase):
+    """analyze_realtime 把最新价并入当天K线，结果与用新价格整段重算一致"""
+
+    def test_latest_price_folded_into_day_bar(self):
+        df = make_frame(random_close(seed=3))
+        last_day = df.index[-1].strftime('%Y-%m-%d')
+        price = round(df['close'].iloc[-1] + 0.25, 2)
+        realtime_data = {'kline_data': [
+            {'timestamp': f'{last_day} 14:50:00', 'close': price - 0.1, 'volume': 100, 'change_percent': 0.1},
+            {'timestamp': f'{last_day} 14:55:00', 'close': price, 'volume': 100, 'change_percent': 0.1},
+        ]}
+        
+        analyzer = StockAnalyzer('test_rt', len(df), df=df)
+        analyzer.calculate_indicators()
+        with mock.patch.object(analyzer, 'get_realtime_data', return_value=realtime_data), \
+                mock.patch('mods.stock_analyzer._realtime_cache_get', return_value=None), \
+                mock.patch('mods.stock_analyzer._realtime_cache_put'):
+            result = analyzer.analyze_realtime()
+        
+        expected = df.copy()
+        expected.iloc[-1, expected.columns.get_loc('close')] = price
+        expected.iloc[-1, expected.columns.get_loc('high')] = max(df['high'].iloc[-1], price)
+        full = StockAnalyzer('test', len(expected), df=expected)
+        full.calculate_indicators()
+        
+        self.assertEqual(analyzer.df['close'].iloc[-1], price)
+        self.assertEqual(result['day_analysis']['analysis'], full.analyze()['analysis'])
+
+
+if __name__ == '__main__':
+    unittest.main()